@@ -10,7 +10,18 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locatel_tech_finance.settings')
 
 application = get_asgi_application()
+
+# Import the URLconf, and with it the views and DRF, while the worker boots
+# instead of during its first request
+get_resolver().url_patterns
+
+# Same for the account index, so the first money request does not load every
+# account number
+from project.accounts import warm_up  # noqa: E402
+
+warm_up()
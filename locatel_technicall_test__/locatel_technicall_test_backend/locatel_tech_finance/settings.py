@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,7 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'project.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'project.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -142,6 +145,51 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # orjson backed JSON, falls back to DRF's renderer and parser without orjson
+    'DEFAULT_RENDERER_CLASSES': (
+        'project.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'project.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # Reverse proxies in front of the app. Client IPs are read from X-Forwarded-For
+    # only past that many proxies, 0 uses the connection's address.
+    'NUM_PROXIES': int(os.environ.get('DJANGO_NUM_PROXIES', 0)),
+    # Token bucket rates for the money-moving endpoints, see project/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'money_ip': '60/min',
+        'money_user': '30/min',
+        'money_account': '30/min',
+    },
+}
+
+# Cache alias holding throttle state shared by all workers (e.g. a Redis cache).
+# None keeps it in each process' memory.
+THROTTLE_CACHE = None
+
+# Maximum amount an account can move within a sliding window of seconds
+ACCOUNT_VELOCITY_LIMIT = {
+    'amount': '10000000.00',
+    'window': 3600,
+}
+
+# Response compression, see project/compression.py for every option
+COMPRESSION = {
+    'ENCODINGS': ['zstd', 'br', 'gzip'],
+    'MIN_SIZE': 1024,
+}
+
+# On-demand request profiling, see project/profiling.py. Enabled with
+# DJANGO_PROFILING=1; requests are then profiled when they carry a header from
+# `manage.py profile_header`, or at SAMPLE_RATE.
+PROFILING = {
+    'ENABLED': os.environ.get('DJANGO_PROFILING', '').lower() in ('1', 'true', 'yes'),
+    'SAMPLE_RATE': 0.0,
+    'DIRECTORY': BASE_DIR / 'profiles',
+    'MAX_FILES': 200,
 }
 
 from datetime import timedelta
@@ -149,4 +197,69 @@ from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
-}
\ No newline at end of file
+    # Blacklist checks answered from memory, see project/revocation.py
+    'TOKEN_REFRESH_SERIALIZER': 'project.revocation.CachedRevocationTokenRefreshSerializer',
+}
+
+# In-process set of revoked refresh tokens (project/revocation.py). CACHE is a
+# shared cache alias used to announce revocations to every worker; without it,
+# workers pick up tokens blacklisted elsewhere after at most REFRESH_SECONDS.
+# Expired tokens are deleted by `manage.py purge_tokens`, run it on a schedule.
+TOKEN_REVOCATION = {
+    'CACHE': None,
+    'REFRESH_SECONDS': 5,
+    # How long ids skipped by a load are looked up again, in case their row commits late
+    'GAP_SECONDS': 3600,
+}
+
+# Concurrency control for balance updates: 'pessimistic' locks the balance rows,
+# 'optimistic' uses compare-and-swap on Balance.version with bounded retries.
+# Views can override it through their concurrency_mode attribute.
+BALANCE_CONCURRENCY_MODE = 'pessimistic'
+BALANCE_OPTIMISTIC_RETRIES = 5
+
+# Real-time balance events served by /events/ (ASGI only)
+EVENTS_BROKER = 'project.events.LocalBroker'
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_QUEUE_SIZE = 100
+
+# In-process account number index (project/accounts.py). CACHE is a shared cache
+# alias used to announce new accounts to every worker, set it whenever more than
+# one process serves the API. Without it, unknown account numbers make a worker
+# look for accounts created elsewhere at most every REFRESH_SECONDS, and those
+# accounts can be rejected until then.
+ACCOUNT_INDEX = {
+    'CACHE': None,
+    'REFRESH_SECONDS': 0.25,
+    'ERROR_RATE': 0.001,
+    # How long ids skipped by a load are looked up again, in case their row commits late
+    'GAP_SECONDS': 600,
+}
+
+# API-only profile, enabled with DJANGO_API_ONLY=1. The API authenticates with
+# JWT only, so workers can skip the admin, sessions, messages, CSRF, static
+# files and templates, and the browsable API that needs them.
+API_ONLY = os.environ.get('DJANGO_API_ONLY', '').lower() in ('1', 'true', 'yes')
+
+if API_ONLY:
+    INSTALLED_APPS = [
+        app for app in INSTALLED_APPS
+        if app not in (
+            'django.contrib.admin',
+            'django.contrib.sessions',
+            'django.contrib.messages',
+            'django.contrib.staticfiles',
+        )
+    ]
+    MIDDLEWARE = [
+        middleware for middleware in MIDDLEWARE
+        if middleware not in (
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.middleware.csrf.CsrfViewMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+            'django.contrib.messages.middleware.MessageMiddleware',
+            'django.middleware.clickjacking.XFrameOptionsMiddleware',
+        )
+    ]
+    TEMPLATES = []
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ('project.renderers.ORJSONRenderer',)
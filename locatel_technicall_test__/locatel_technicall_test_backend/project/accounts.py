@@ -0,0 +1,310 @@
+import hashlib
+import math
+import threading
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import DatabaseError, connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Customer
+from .watermark import IdWatermark
+
+Account = namedtuple('Account', ['customer_id', 'user_id'])
+
+GENERATION_KEY = 'account_index_generation'
+EDITS_KEY = 'account_index_edits'
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter over strings, using double hashing on a blake2b digest.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class AccountIndex:
+    """
+    In-process map from account number to customer, with a Bloom filter of
+    every known account number in front of it.
+
+    New accounts registered by this process are added right away. Before an
+    account number missing from the filter is rejected, accounts created
+    elsewhere are picked up by an indexed incremental load by id. The load
+    runs whenever the shared generation counter in ACCOUNT_INDEX['CACHE']
+    moved, and otherwise at most every ACCOUNT_INDEX['REFRESH_SECONDS'], which
+    bounds the queries caused by unknown numbers. Without a shared cache, an
+    account created by another process can thus be rejected for up to
+    REFRESH_SECONDS; keep it short, or set CACHE when several processes
+    serve. Customers that commit after a customer with a higher id are still
+    picked up, see IdWatermark.
+
+    Account numbers edited or deleted by this process are updated right away.
+    Other processes see the shared edits counter move, checked at most every
+    REFRESH_SECONDS, and rebuild their index; without a shared cache they
+    only see those changes once they restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._accounts = None
+        self._bloom = None
+        self._watermark = IdWatermark(self.options['GAP_SECONDS'])
+        self._generation = None
+        self._refreshed_at = 0
+        self._edits = None
+        self._edits_checked_at = 0
+
+    @property
+    def options(self):
+        return {
+            'CACHE': None, 'REFRESH_SECONDS': 0.25, 'ERROR_RATE': 0.001, 'GAP_SECONDS': 600,
+            **getattr(settings, 'ACCOUNT_INDEX', {})
+        }
+
+    def _shared_value(self, key):
+        alias = self.options['CACHE']
+        if not alias:
+            return None
+        try:
+            return caches[alias].get(key)
+        except Exception:
+            return None
+
+    def _shared_generation(self):
+        return self._shared_value(GENERATION_KEY)
+
+    def _check_edits(self):
+        """
+        Rebuild the index when another process edited or deleted accounts.
+        """
+        if not self.options['CACHE']:
+            return
+        now = time.monotonic()
+        if now - self._edits_checked_at < self.options['REFRESH_SECONDS']:
+            return
+        self._edits_checked_at = now
+        if self._shared_value(EDITS_KEY) != self._edits:
+            self.rebuild()
+
+    def rebuild(self):
+        """
+        Load every account number from the database.
+        """
+        with self._lock:
+            self._accounts = {}
+            self._watermark.reset()
+            self._edits = self._shared_value(EDITS_KEY)
+            self._edits_checked_at = time.monotonic()
+            try:
+                capacity = Customer.objects.count()
+                # Leave room for the accounts registered until the next rebuild
+                self._bloom = BloomFilter(capacity * 2 + 1000, self.options['ERROR_RATE'])
+                self._load_new()
+            except BaseException:
+                # Left half loaded, the next resolve starts over
+                self._accounts = None
+                raise
+
+    def _load_new(self):
+        self._generation = self._shared_generation()
+        rows = self._watermark.load(Customer.objects.values_list('id', 'account_number', 'user_id'))
+        for customer_id, account_number, user_id in rows:
+            self._add(account_number, customer_id, user_id)
+        self._refreshed_at = time.monotonic()
+        self._grow_if_full()
+
+    def _add(self, account_number, customer_id, user_id):
+        self._accounts[account_number] = Account(customer_id, user_id)
+        self._bloom.add(account_number)
+
+    def _grow_if_full(self):
+        # Past its capacity the filter's error rate climbs, start over bigger
+        if self._bloom.count >= self._bloom.capacity:
+            self.rebuild()
+
+    def _maybe_refresh(self):
+        """
+        Load accounts created by other processes if there may be any, called
+        before rejecting an account number.
+
+        Returns:
+            bool: Whether new accounts were looked for.
+        """
+        generation = self._shared_generation()
+        stale = time.monotonic() - self._refreshed_at >= self.options['REFRESH_SECONDS']
+        if generation != self._generation or stale:
+            self._load_new()
+            return True
+        return False
+
+    def resolve(self, account_number):
+        """
+        Find the customer owning an account number.
+
+        Returns:
+            Account: The customer and user ids, or None if the account does not exist.
+        """
+        with self._lock:
+            if self._accounts is None:
+                self.rebuild()
+            else:
+                self._check_edits()
+            if account_number not in self._bloom and not (
+                self._maybe_refresh() and account_number in self._bloom
+            ):
+                return None
+            account = self._accounts.get(account_number)
+            if account is not None:
+                return account
+
+        # Bloom filter false positive, or an account deleted from the map
+        row = Customer.objects.filter(account_number=account_number).values_list('id', 'user_id').first()
+        if row is None:
+            return None
+        with self._lock:
+            if self._accounts is not None:
+                self._add(account_number, *row)
+        return Account(*row)
+
+    def add(self, customer):
+        with self._lock:
+            if self._accounts is not None:
+                self._add(customer.account_number, customer.id, customer.user_id)
+                self._grow_if_full()
+
+    def remove(self, customer, account_number=None):
+        """
+        Forget a customer's account number, by default its current one. The
+        number stays in the Bloom filter, resolving it then asks the database.
+        """
+        account_number = account_number or customer.account_number
+        with self._lock:
+            account = self._accounts.get(account_number) if self._accounts is not None else None
+            # The number may already belong to another customer
+            if account is not None and account.customer_id == customer.id:
+                del self._accounts[account_number]
+
+    def rename(self, old_account_number, customer):
+        with self._lock:
+            self.remove(customer, old_account_number)
+            self.add(customer)
+
+
+account_index = AccountIndex()
+
+
+def warm_up():
+    """
+    Load the account index while a worker boots instead of on its first request.
+
+    Connections opened here are closed, they must not be shared with the
+    processes a preloading server forks. When the database is not reachable
+    yet, the index is loaded on the first resolve as usual.
+    """
+    try:
+        account_index.rebuild()
+    except DatabaseError:
+        pass
+    finally:
+        connections.close_all()
+
+
+def bump_shared_counter(key):
+    alias = account_index.options['CACHE']
+    if not alias:
+        return
+    try:
+        cache = caches[alias]
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception:
+        pass
+
+
+def notify_accounts_changed():
+    """
+    Tell the other processes' indexes that accounts were created.
+    """
+    bump_shared_counter(GENERATION_KEY)
+
+
+def notify_accounts_edited():
+    """
+    Tell the other processes' indexes that account numbers were edited or deleted.
+    """
+    bump_shared_counter(EDITS_KEY)
+
+
+@checks.register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Ask for ACCOUNT_INDEX['CACHE'] in deployments, where several processes serve.
+    """
+    if account_index.options['CACHE']:
+        return []
+    return [checks.Warning(
+        "ACCOUNT_INDEX['CACHE'] is not set, so accounts created by another process "
+        "can be rejected for up to ACCOUNT_INDEX['REFRESH_SECONDS'], and account "
+        "numbers it edits or deletes keep resolving until restart.",
+        hint="Set it to a cache alias shared by every process serving the API.",
+        id='project.W001',
+    )]
+
+
+@receiver(pre_save, sender=Customer)
+def remember_account_number(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Keep the stored account number of an edited customer, to unindex it if it changes.
+    """
+    if raw or instance.pk is None or (update_fields is not None and 'account_number' not in update_fields):
+        return
+    instance._indexed_account_number = (
+        Customer.objects.filter(pk=instance.pk).values_list('account_number', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Customer)
+def index_customer(sender, instance, created, **kwargs):
+    if created:
+        def on_commit():
+            account_index.add(instance)
+            notify_accounts_changed()
+        transaction.on_commit(on_commit)
+        return
+
+    old_account_number = instance.__dict__.pop('_indexed_account_number', None)
+    if old_account_number is not None and old_account_number != instance.account_number:
+        def on_commit():
+            account_index.rename(old_account_number, instance)
+            notify_accounts_edited()
+        transaction.on_commit(on_commit)
+
+
+@receiver(post_delete, sender=Customer)
+def unindex_customer(sender, instance, **kwargs):
+    def on_commit():
+        account_index.remove(instance)
+        notify_accounts_edited()
+    transaction.on_commit(on_commit)
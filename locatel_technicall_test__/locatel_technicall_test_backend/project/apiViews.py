@@ -1,13 +1,27 @@
 from rest_framework.views import APIView
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.decorators import action
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User
-from .models import Customer, Balance
+from django.http import FileResponse
+from .models import Customer, Balance, ScheduledTransfer
 from .serializers import *
+from .etags import profile_etag, balances_etag, etag_matches
+from .search import MIN_TERM_LENGTH, search_customers
+from .profiling import list_profiles, get_profile_path
+from .throttling import (
+    UserTokenBucketThrottle, AccountTokenBucketThrottle, IPTokenBucketThrottle, AccountVelocityThrottle,
+    charge_validated_consignation, record_velocity
+)
+
+# Throttles shared by every endpoint that moves money
+MONEY_THROTTLES = [
+    IPTokenBucketThrottle, UserTokenBucketThrottle, AccountTokenBucketThrottle, AccountVelocityThrottle
+]
 
 class RegisterViewSet(viewsets.ModelViewSet):
     """
@@ -79,6 +93,9 @@ class ConsignationAPI(APIView):
     """
     API endpoint for managing consignations.
     """
+    throttle_classes = MONEY_THROTTLES
+    # None uses settings.BALANCE_CONCURRENCY_MODE, or set 'pessimistic' / 'optimistic'
+    concurrency_mode = None
 
     def get(self, request):
         """
@@ -88,11 +105,16 @@ class ConsignationAPI(APIView):
             request (Request): The request object.
 
         Returns:
-            Response: The list of all balance records with status code 200.
+            Response: The list of all balance records with status code 200,
+                      or an empty 304 response if the client's ETag is still current.
         """
+        etag = balances_etag()
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
         balances = Balance.objects.all()
         serializer = BalanceSerializer(balances, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.data, status=status.HTTP_200_OK, headers={'ETag': etag})
 
     def post(self, request):
         """
@@ -105,12 +127,14 @@ class ConsignationAPI(APIView):
             Response: HTTP response object. Returns success message and transaction data on successful consignation,
                       or error message on failed consignation.
         """
-        serializer = ConsignationSerializer(data=request.data)
+        serializer = ConsignationSerializer(data=request.data, context={'concurrency_mode': self.concurrency_mode})
         if serializer.is_valid():
+            charge_validated_consignation(request, serializer.receiver_account.user_id)
             transaction_data = serializer.save()
+            record_velocity(request)
             return Response({
                 'message': 'Consignation successful',
-                'transaction': transaction_data.data
+                'transaction': transaction_data
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -120,6 +144,9 @@ class WithdrawalAPI(APIView):
     API endpoint that manages withdrawals for authenticated users.
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = MONEY_THROTTLES
+    # None uses settings.BALANCE_CONCURRENCY_MODE, or set 'pessimistic' / 'optimistic'
+    concurrency_mode = None
 
     def post(self, request):
         """
@@ -132,9 +159,10 @@ class WithdrawalAPI(APIView):
             Response: HTTP response object with status code 200 on successful withdrawal,
                       including transaction details, or with status code 400 on failure.
         """
-        serializer = WithdrawalSerializer(data=request.data, context={'request': request})
+        serializer = WithdrawalSerializer(data=request.data, context={'request': request, 'concurrency_mode': self.concurrency_mode})
         if serializer.is_valid():
             transaction_, balance_amount = serializer.save()
+            record_velocity(request)
             return Response({
                 'message': 'Withdrawal successful.',
                 'transaction_id': transaction_.id,
@@ -168,6 +196,9 @@ class TransferAPIView(APIView):
     API endpoint that manages money transfers between users.
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = MONEY_THROTTLES
+    # None uses settings.BALANCE_CONCURRENCY_MODE, or set 'pessimistic' / 'optimistic'
+    concurrency_mode = None
 
     def post(self, request, *args, **kwargs):
         """
@@ -182,9 +213,10 @@ class TransferAPIView(APIView):
             Response: HTTP response object with a status code 200 if the transfer is successful,
                       including detailed transaction information, or with status code 400 on failure.
         """
-        serializer = TransferSerializer(data=request.data, context={'request': request})
+        serializer = TransferSerializer(data=request.data, context={'request': request, 'concurrency_mode': self.concurrency_mode})
         if serializer.is_valid():
             result = serializer.save()
+            record_velocity(request)
             response_data = {
                 "message": "Transfer successful",
                 "user_emisor": result['user_emisor'],
@@ -211,18 +243,173 @@ class UserProfileAPIView(APIView):
 
         Returns:
             Response: HTTP response object with a status code 200 if the profile is found,
-                      or 404 if not found. The response includes the customer's profile data or an error message.
+                      304 if the client's ETag is still current, or 404 if not found.
+                      The response includes the customer's profile data or an error message.
         """
         # Assuming the customer ID should be passed in the request; here we use a static ID for demonstration
         customer_id = request.query_params.get('id', 12)  # Get ID from query params or default to 12
+
+        # Answer conditional requests from the balance version alone
+        etag = profile_etag(customer_id)
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
         customer = Customer.objects.filter(id=customer_id).first()
 
         if not customer:
             return Response({"message": "User profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
         serializer = UserProfileSerializer(customer)
-        return Response({"message": "User profile found.", "data": serializer.data}, status=status.HTTP_200_OK)
+        headers = {'ETag': etag} if etag else None
+        return Response({"message": "User profile found.", "data": serializer.data}, status=status.HTTP_200_OK, headers=headers)
     
+class ScheduledTransferAPIView(APIView):
+    """
+    API endpoint for the authenticated user's standing orders.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = MONEY_THROTTLES
+
+    def get(self, request):
+        """
+        List the user's scheduled transfers, newest first.
+
+        Args:
+            request (Request): The request object.
+
+        Returns:
+            Response: HTTP response object with a status code 200 and the scheduled transfers.
+        """
+        orders = (
+            ScheduledTransfer.objects.filter(user_emisor=request.user)
+            .select_related('user_receptor__customer')
+            .order_by('-created_at')
+        )
+        serializer = ScheduledTransferSerializer(orders, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        """
+        Schedule a one-off or recurring transfer.
+
+        Args:
+            request (Request): The request object with the receiving account_number, amount,
+                               interval ('once', 'daily', 'weekly' or 'monthly') and optional start_at.
+
+        Returns:
+            Response: HTTP response object with a status code 201 and the scheduled transfer,
+                      or 400 with the validation errors.
+        """
+        serializer = ScheduledTransferSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ScheduledTransferCancelAPIView(APIView):
+    """
+    API endpoint to cancel one of the authenticated user's standing orders.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, pk):
+        """
+        Deactivate a scheduled transfer, keeping it in the user's history.
+
+        Args:
+            request (Request): The request object.
+            pk (int): The scheduled transfer id.
+
+        Returns:
+            Response: An empty response with status code 204, or 404 if the user has no such order.
+        """
+        if not ScheduledTransfer.objects.filter(pk=pk, user_emisor=request.user).update(active=False):
+            return Response({"message": "Scheduled transfer not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CustomerSearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CustomerSearchAPIView(APIView):
+    """
+    API endpoint for back-office staff to search customers.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        Search customers by partial document number, account number or name.
+
+        Args:
+            request (Request): The request object, with the search text in the 'q'
+                               query parameter and optional 'page' and 'page_size'.
+
+        Returns:
+            Response: HTTP response object with a status code 200 and a ranked,
+                      paginated list of customers, or 400 if a word of the search text is too short.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query or any(len(term) < MIN_TERM_LENGTH for term in query.split()):
+            return Response(
+                {"message": f"Every word of the search text must have at least {MIN_TERM_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        paginator = CustomerSearchPagination()
+        page = paginator.paginate_queryset(search_customers(query), request, view=self)
+        serializer = CustomerSearchSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ProfileListAPIView(APIView):
+    """
+    API endpoint for staff to list the stored request profiles.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        List the stored request profiles, newest first.
+
+        Args:
+            request (Request): The request object.
+
+        Returns:
+            Response: HTTP response object with a status code 200 and the name,
+                      size and creation time of each profile.
+        """
+        return Response(list_profiles(), status=status.HTTP_200_OK)
+
+
+class ProfileDownloadAPIView(APIView):
+    """
+    API endpoint for staff to download a stored request profile.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, name):
+        """
+        Download a stored request profile.
+
+        Args:
+            request (Request): The request object.
+            name (str): The profile name, as listed by ProfileListAPIView.
+
+        Returns:
+            FileResponse: The profile as an attachment, a cProfile dump (.prof)
+                          or collapsed sampled stacks (.folded), or 404 if it does not exist.
+        """
+        path = get_profile_path(name)
+        if path is None:
+            return Response({"message": "Profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+
+
 class MyTokenObtainPairView(TokenObtainPairView):
     """
     API endpoint for obtaining JWT access and refresh tokens.
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ProjectConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'project'
+
+    def ready(self):
+        # Keeps the account index in sync with new and deleted customers
+        from . import accounts  # noqa: F401
+        # Moves the ETags of profiles whose user or customer row is edited
+        from . import etags  # noqa: F401
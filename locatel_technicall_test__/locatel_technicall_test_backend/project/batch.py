@@ -0,0 +1,141 @@
+import multiprocessing
+import django
+from decimal import Decimal
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from .models import Balance, Transaction, BatchCheckpoint
+
+INTEREST = 'interest'
+FEE = 'fee'
+
+
+def id_chunks(model, chunk_size):
+    """
+    Split the primary key range of a model into half-open [start, end) chunks.
+
+    Chunk starts are multiples of chunk_size, so the same id always falls in
+    the same chunk, whatever rows were deleted or added in between.
+    """
+    bounds = model.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    low = bounds['low'] - bounds['low'] % chunk_size
+    return [
+        (start, start + chunk_size)
+        for start in range(low, bounds['high'] + 1, chunk_size)
+    ]
+
+
+def init_worker():
+    """
+    Pool initializer, makes Django usable in spawned worker processes.
+    """
+    django.setup()
+
+
+def run_in_pool(function, tasks, workers):
+    """
+    Run a function over a list of tasks, in worker processes when workers > 1.
+
+    Yields:
+        The results in completion order.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield function(task)
+        return
+    # Forked children must open their own database connections
+    connections.close_all()
+    with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        yield from pool.imap_unordered(function, tasks)
+
+
+def adjustment_sql(kind):
+    """
+    Build the SQL applying an adjustment to a range of balances and recording
+    one transaction per adjusted balance.
+
+    The amount expression takes the rate (interest) or the fixed fee as its
+    only parameter. Interest is added to positive balances, fees are charged
+    to balances that can cover them.
+    """
+    quote = connection.ops.quote_name
+    balance_table = quote(Balance._meta.db_table)
+    transaction_table = quote(Transaction._meta.db_table)
+    if kind == INTEREST:
+        amount, sign, condition = 'ROUND(balance * %s, 2)', '+', 'ROUND(balance * %s, 2) > 0'
+    else:
+        amount, sign, condition = '%s', '-', 'balance >= %s'
+    columns = 'user_receptor_id, user_emisor, is_add, transaction_date, amount, type'
+
+    if connection.vendor == 'postgresql':
+        # One statement: lock and compute the adjustments, UPDATE ... FROM them,
+        # then INSERT ... SELECT the transactions from the updated rows
+        return [f"""
+            WITH adjustments AS (
+                SELECT id, {amount} AS amount FROM {balance_table}
+                WHERE id >= %s AND id < %s AND {condition}
+                FOR UPDATE
+            ), updated AS (
+                UPDATE {balance_table} AS b
+                SET balance = b.balance {sign} a.amount, version = b.version + 1
+                FROM adjustments AS a WHERE b.id = a.id
+                RETURNING b.user_id, a.amount
+            )
+            INSERT INTO {transaction_table} ({columns})
+            SELECT user_id, %s, %s, %s, amount, %s FROM updated
+        """]
+
+    # Other backends: record the transactions first, then apply the same amounts
+    return [
+        f"""
+            INSERT INTO {transaction_table} ({columns})
+            SELECT user_id, %s, %s, %s, {amount}, %s FROM {balance_table}
+            WHERE id >= %s AND id < %s AND {condition}
+        """,
+        f"""
+            UPDATE {balance_table}
+            SET balance = balance {sign} {amount}, version = version + 1
+            WHERE id >= %s AND id < %s AND {condition}
+        """,
+    ]
+
+
+def apply_adjustment_chunk(task):
+    """
+    Apply an interest or fee adjustment to one chunk of balances.
+
+    The checkpoint row is written in the same transaction as the adjustment,
+    so a chunk is applied exactly once even across restarts or parallel workers.
+
+    Args:
+        task (tuple): (job, kind, value, start, end), value being the rate or the fee.
+
+    Returns:
+        int: The number of adjusted balances, or None if the chunk was already done.
+    """
+    job, kind, value, start, end = task
+    value = Decimal(value)
+    is_add = kind == INTEREST
+    now = timezone.now()
+    with transaction.atomic():
+        # Only a duplicate checkpoint means the chunk is done, errors of the
+        # adjustment itself are raised
+        try:
+            with transaction.atomic():
+                checkpoint = BatchCheckpoint.objects.create(job=job, chunk_start=start)
+        except IntegrityError:
+            return None
+        statements = adjustment_sql(kind)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(statements[0], [value, start, end, value, job, is_add, now, kind])
+                rows = cursor.rowcount
+            else:
+                cursor.execute(statements[0], [job, is_add, now, value, kind, start, end, value])
+                rows = cursor.rowcount
+                cursor.execute(statements[1], [value, start, end, value])
+        checkpoint.rows = rows
+        checkpoint.save(update_fields=['rows'])
+    return rows
@@ -0,0 +1,187 @@
+import gzip
+import zlib
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULTS = {
+    # Server preference, the first one the client accepts wins
+    'ENCODINGS': ['zstd', 'br', 'gzip'],
+    'LEVELS': {'zstd': 3, 'br': 4, 'gzip': 6},
+    # Smaller bodies, e.g. money-moving results, are sent as they are
+    'MIN_SIZE': 1024,
+    # Responses to other methods carry tokens or money-moving results, which
+    # are small and, being secrets next to reflected input, exposed to BREACH
+    'METHODS': ['GET', 'HEAD'],
+    # text/event-stream is left out, compressors hold back bytes that events need sent right away
+    'CONTENT_TYPES': ['application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'],
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'COMPRESSION', {})}
+
+
+class GzipStream:
+    def __init__(self, level):
+        # wbits 31 writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+def available_codecs():
+    """
+    Return the codecs whose library is installed, as a mapping of encoding to
+    (compress function taking bytes and a level, stream class).
+    """
+    codecs = {'gzip': (lambda data, level: gzip.compress(data, compresslevel=level, mtime=0), GzipStream)}
+    if brotli is not None:
+        codecs['br'] = (lambda data, level: brotli.compress(data, quality=level), BrotliStream)
+    if zstandard is not None:
+        codecs['zstd'] = (lambda data, level: zstandard.ZstdCompressor(level=level).compress(data), ZstdStream)
+    return codecs
+
+
+def parse_accept_encoding(header):
+    """
+    Parse an Accept-Encoding header into a mapping of encoding to q-value.
+    """
+    accepted = {}
+    for item in header.split(','):
+        encoding, *params = [part.strip() for part in item.split(';')]
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding.lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(header, encodings, codecs):
+    """
+    Pick the first encoding in server preference order that the client accepts.
+
+    Returns:
+        str: The encoding, or None to send the response uncompressed.
+    """
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0)
+    for encoding in encodings:
+        if encoding in codecs and accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with zstd, brotli or gzip, as negotiated through
+    Accept-Encoding. zstd and brotli are used only when their libraries are
+    installed.
+
+    Regular responses are compressed when they are at least COMPRESSION['MIN_SIZE']
+    bytes and the result is smaller. Streaming responses, sync or async, are
+    compressed chunk by chunk and flushed after each chunk. Server-sent events
+    and content types outside COMPRESSION['CONTENT_TYPES'] are left alone.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.options = get_options()
+        self.codecs = available_codecs()
+
+    def process_response(self, request, response):
+        if not self.should_compress(request, response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.options['ENCODINGS'], self.codecs)
+        if encoding is None:
+            return response
+        compress, stream_class = self.codecs[encoding]
+        level = self.options['LEVELS'][encoding]
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.compress_async_stream(response.streaming_content, stream_class(level))
+            else:
+                response.streaming_content = self.compress_stream(response.streaming_content, stream_class(level))
+            # The length of the compressed stream is not known in advance
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, level)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # The compressed body is no longer byte-for-byte the representation a strong ETag names
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def should_compress(self, request, response):
+        if request.method not in self.options['METHODS'] or response.has_header('Content-Encoding'):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.options['CONTENT_TYPES']:
+            return False
+        return response.streaming or len(response.content) >= self.options['MIN_SIZE']
+
+    @staticmethod
+    def compress_stream(chunks, stream):
+        for chunk in chunks:
+            if data := stream.compress(chunk):
+                yield data
+        yield stream.finish()
+
+    @staticmethod
+    async def compress_async_stream(chunks, stream):
+        async for chunk in chunks:
+            if data := stream.compress(chunk):
+                yield data
+        yield stream.finish()
@@ -0,0 +1,86 @@
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Max, Sum
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.http import parse_etags, quote_etag
+from .models import Balance, Customer
+
+
+def profile_etag(customer_id):
+    """
+    Build the ETag of a customer's profile from its balance version.
+
+    The version also moves when the customer's User or Customer row is saved,
+    see bump_balance_version, so profile edits change the ETag too.
+
+    Args:
+        customer_id: ID of the customer whose profile is requested.
+
+    Returns:
+        str: Quoted weak ETag, or None if the customer has no balance.
+    """
+    # Single lookup through the unique user index, no serializer involved
+    version = Balance.objects.filter(user__customer__id=customer_id).values_list('version', flat=True).first()
+    if version is None:
+        return None
+    return weak_etag(f"profile-{customer_id}-{version}")
+
+
+def balances_etag():
+    """
+    Build the ETag of the full balance listing.
+
+    Versions only grow, so their sum changes whenever a balance is mutated.
+    A deleted balance could be made up for by a new one and bumps elsewhere,
+    so the count and the highest id, which grows with every new balance, are
+    part of the tag too.
+
+    Returns:
+        str: Quoted weak ETag.
+    """
+    totals = Balance.objects.aggregate(versions=Sum('version'), count=Count('id'), last_id=Max('id'))
+    return weak_etag(f"balances-{totals['count']}-{totals['last_id'] or 0}-{totals['versions'] or 0}")
+
+
+def weak_etag(value):
+    """
+    Quote an ETag as weak. The tags name the data, not the bytes of one
+    rendering or encoding of it, so 200 responses, compressed or not, and
+    304 responses all carry the same tag.
+    """
+    return 'W/' + quote_etag(value)
+
+
+def etag_matches(request, etag):
+    """
+    Check whether the request's If-None-Match header matches an ETag.
+
+    Args:
+        request (Request): The incoming request.
+        etag (str): The current quoted ETag of the resource.
+
+    Returns:
+        bool: True if the client already holds the current representation.
+    """
+    header = request.headers.get('If-None-Match')
+    if not header or etag is None:
+        return False
+    # If-None-Match uses weak comparison, W/ prefixes are ignored on both sides
+    client_etags = [value.removeprefix('W/') for value in parse_etags(header)]
+    return '*' in client_etags or etag.removeprefix('W/') in client_etags
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Customer)
+def bump_balance_version(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Bump the balance version of a user whose User or Customer row was saved.
+
+    The profile and balance listing include fields of both rows, and their
+    ETags are built from balance versions only. Saves that only record a
+    login are skipped. Optimistic balance writers racing with the bump retry.
+    """
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    user_id = instance.pk if sender is User else instance.user_id
+    Balance.objects.filter(user_id=user_id).update(version=F('version') + 1)
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from functools import lru_cache
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class LocalBroker:
+    """
+    In-process pub/sub broker.
+
+    Subscribers are asyncio queues living in the ASGI event loop, while publishers
+    are usually sync views running in worker threads, so events are handed over
+    with call_soon_threadsafe. Only subscribers served by the same process receive
+    the events; a shared backend can be plugged in through settings.EVENTS_BROKER.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """
+        Register a queue for a user's events. Must be called from the event loop.
+
+        Returns:
+            tuple: The subscription, to be passed to unsubscribe, and its queue.
+        """
+        queue = asyncio.Queue(getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+        subscription = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription, queue
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event):
+        """
+        Deliver an event to every subscriber of a user. Safe to call from any thread.
+        """
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscriptions:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # The loop was closed, the subscriber is going away
+                pass
+
+    @staticmethod
+    def _offer(queue, event):
+        # Slow clients lose their oldest events instead of growing the queue
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """
+    Return the process-wide broker configured in settings.EVENTS_BROKER.
+    """
+    return import_string(getattr(settings, 'EVENTS_BROKER', 'project.events.LocalBroker'))()
+
+
+def publish_on_commit(user_id, name, data):
+    """
+    Publish an event once the current database transaction commits.
+
+    Args:
+        user_id (int): The user that should receive the event.
+        name (str): The event name, e.g. 'balance' or 'transaction'.
+        data (dict): JSON serializable payload.
+    """
+    transaction.on_commit(lambda: get_broker().publish(user_id, {'event': name, 'data': data}))
+
+
+def notify_transaction(user_id, transaction_, balance):
+    """
+    Announce a new transaction and the resulting balance to a user.
+    """
+    publish_on_commit(user_id, 'transaction', {
+        'id': transaction_.id,
+        'user_emisor': str(transaction_.user_emisor),
+        'amount': str(transaction_.amount),
+        'transaction_date': transaction_.transaction_date.isoformat(),
+        'type': transaction_.type,
+        'is_add': transaction_.is_add,
+    })
+    publish_on_commit(user_id, 'balance', {'balance': str(balance)})
@@ -0,0 +1,73 @@
+import time
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from project.batch import INTEREST, FEE, id_chunks, run_in_pool, apply_adjustment_chunk
+from project.models import Balance, BatchCheckpoint, BatchJob
+
+
+class Command(BaseCommand):
+    help = "Apply interest or a maintenance fee to every balance in set-based, resumable chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('job', help="Unique job name, e.g. interest-2026-10. Rerunning a job resumes it.")
+        parser.add_argument('kind', choices=[INTEREST, FEE])
+        parser.add_argument('value', help="Interest rate (0.005 for 0.5%%) or fixed fee amount.")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Balances per chunk.")
+        parser.add_argument('--workers', type=int, default=1, help="Parallel worker processes.")
+
+    def handle(self, *args, **options):
+        try:
+            value = Decimal(options['value'])
+        except InvalidOperation:
+            raise CommandError("value must be a decimal number.")
+        if value <= 0:
+            raise CommandError("value must be positive.")
+
+        job = options['job']
+        self.check_parameters(job, options['kind'], value, options['chunk_size'])
+        done = set(BatchCheckpoint.objects.filter(job=job).values_list('chunk_start', flat=True))
+        tasks = [
+            (job, options['kind'], str(value), start, end)
+            for start, end in id_chunks(Balance, options['chunk_size'])
+            if start not in done
+        ]
+        if done:
+            self.stdout.write(f"Resuming {job}: {len(done)} chunks already applied.")
+
+        rows = 0
+        start_time = time.perf_counter()
+        for count in run_in_pool(apply_adjustment_chunk, tasks, options['workers']):
+            rows += count or 0
+        elapsed = time.perf_counter() - start_time
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{job}: {len(tasks)} chunks, {rows} balances adjusted in {elapsed:.2f}s "
+            f"({rows / elapsed if elapsed else 0:.0f} rows/s)"
+        ))
+
+    def check_parameters(self, job, kind, value, chunk_size):
+        """
+        Record the parameters of a new job, or make sure a rerun uses the ones it
+        started with: checkpoints are keyed by chunk start, so another chunk size
+        or value would apply the adjustment twice to some balances.
+
+        Raises:
+            CommandError: If the job was started with other parameters.
+        """
+        params, created = BatchJob.objects.get_or_create(
+            job=job, defaults={'kind': kind, 'value': str(value), 'chunk_size': chunk_size}
+        )
+        if created:
+            if BatchCheckpoint.objects.filter(job=job).exists():
+                params.delete()
+                raise CommandError(f"{job} was started without recorded parameters and cannot be resumed safely.")
+            return
+        if (params.kind, Decimal(params.value), params.chunk_size) != (kind, value, chunk_size):
+            raise CommandError(
+                f"{job} was started as {params.kind} {params.value} with --chunk-size {params.chunk_size}, "
+                f"rerun it with the same parameters or use another job name."
+            )
+        # Chunks used to start at the lowest id of the run, those cannot be matched any more
+        done = BatchCheckpoint.objects.filter(job=job).values_list('chunk_start', flat=True)
+        if any(start % chunk_size for start in done):
+            raise CommandError(f"{job} was started with unaligned chunks and cannot be resumed safely.")
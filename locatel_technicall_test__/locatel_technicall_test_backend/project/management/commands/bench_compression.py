@@ -0,0 +1,63 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+from project.compression import available_codecs, get_options
+from project.models import Customer
+
+
+class Command(BaseCommand):
+    help = "Report bytes saved and CPU cost of each response compression codec per endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="User the requests are made as, defaults to the first staff user.")
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Lets the test client's 'testserver' host through ALLOWED_HOSTS
+        setup_test_environment()
+        try:
+            self.benchmark(options)
+        finally:
+            teardown_test_environment()
+
+    def benchmark(self, options):
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_staff=True).order_by('id').first() or User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError("There is no user to make the requests as.")
+
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        customer = Customer.objects.filter(user=user).first() or Customer.objects.order_by('id').first()
+        endpoints = {'balances': reverse('consignation')}
+        if customer is not None:
+            endpoints['profile'] = f"{reverse('user_profile')}?id={customer.id}"
+            if user.is_staff:
+                endpoints['search'] = f"{reverse('customer_search')}?q={customer.document_number[:3]}&page_size=100"
+
+        levels = get_options()['LEVELS']
+        codecs = available_codecs()
+        iterations = options['iterations']
+        self.stdout.write(f"codecs: {', '.join(codecs)}, min_size={get_options()['MIN_SIZE']} bytes")
+
+        for name, url in endpoints.items():
+            response = client.get(url, HTTP_ACCEPT_ENCODING='identity')
+            if response.status_code != 200:
+                self.stdout.write(self.style.WARNING(f"{name}: {url} answered {response.status_code}, skipped"))
+                continue
+            body = response.content
+            self.stdout.write(f"{name}: {len(body)} bytes")
+            for encoding, (compress, _) in codecs.items():
+                start = time.process_time()
+                for _ in range(iterations):
+                    compressed = compress(body, levels[encoding])
+                cpu = (time.process_time() - start) / iterations
+                saved = 1 - len(compressed) / len(body) if body else 0
+                self.stdout.write(
+                    f"  {encoding:<5} {len(compressed):>9} bytes  saved={saved:6.1%}  cpu={cpu * 1e6:9.1f}us"
+                )
@@ -0,0 +1,82 @@
+import random
+import threading
+import time
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from project.models import Customer, Balance
+from project.services import transfer, PESSIMISTIC, OPTIMISTIC
+
+
+class Command(BaseCommand):
+    help = "Compare pessimistic and optimistic transfer throughput at different conflict rates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=200, help="Number of benchmark accounts.")
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent workers.")
+        parser.add_argument('--transfers', type=int, default=200, help="Transfers per worker.")
+        parser.add_argument('--hot-accounts', type=int, default=2, help="Size of the contended account set.")
+        parser.add_argument(
+            '--conflict-rates', default='0,0.1,0.5,0.9',
+            help="Comma separated probabilities of sending from a hot account."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                "SQLite serializes writers and ignores row locks, results are only meaningful on PostgreSQL."
+            ))
+        users = self.create_accounts(options['accounts'])
+        try:
+            for rate in [float(value) for value in options['conflict_rates'].split(',')]:
+                for mode in (PESSIMISTIC, OPTIMISTIC):
+                    done, failed, elapsed = self.run(users, mode, rate, options)
+                    self.stdout.write(
+                        f"mode={mode:<11} conflict_rate={rate:<4} transfers={done:<6} "
+                        f"failed={failed:<5} seconds={elapsed:.2f} throughput={done / elapsed:.1f}/s"
+                    )
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def create_accounts(self, count):
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'bench-{i}@bench.local', email=f'bench-{i}@bench.local') for i in range(count)
+            ])
+            Customer.objects.bulk_create([
+                Customer(user=user, document_type='CC', document_number=f'bench-{user.pk}', account_number=f'bench-{user.pk}')
+                for user in users
+            ])
+            Balance.objects.bulk_create([Balance(user=user, balance=Decimal('1000000.00')) for user in users])
+        return users
+
+    def run(self, users, mode, rate, options):
+        hot = users[:options['hot_accounts']]
+        counters = {'done': 0, 'failed': 0}
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                for _ in range(options['transfers']):
+                    sender = random.choice(hot) if random.random() < rate else random.choice(users)
+                    receiver = random.choice(users)
+                    if receiver == sender:
+                        continue
+                    try:
+                        transfer(sender, receiver, Decimal('1.00'), mode=mode)
+                        key = 'done'
+                    except Exception:
+                        key = 'failed'
+                    with lock:
+                        counters[key] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counters['done'], counters['failed'], time.perf_counter() - start
@@ -0,0 +1,110 @@
+import asyncio
+import gc
+import threading
+import time
+import tracemalloc
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+from project.events import get_broker
+
+
+class Command(BaseCommand):
+    help = "Hold many idle event streams in process and measure memory per connection and fan-out latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=5000, help="Number of idle streams to open.")
+        parser.add_argument('--users', type=int, default=1000, help="Distinct users the streams are spread over.")
+
+    def handle(self, *args, **options):
+        users = list(User.objects.order_by('id')[:options['users']])
+        if not users:
+            raise CommandError("There are no users to open streams for.")
+        tokens = {user.id: str(AccessToken.for_user(user)) for user in users}
+
+        from locatel_tech_finance.asgi import application
+        # Lets the 'testserver' host through ALLOWED_HOSTS. Heartbeats would
+        # wake every stream, the benchmark wants them idle
+        setup_test_environment()
+        try:
+            with override_settings(EVENTS_HEARTBEAT_SECONDS=3600):
+                asyncio.run(self.run(application, tokens, options['connections']))
+        finally:
+            teardown_test_environment()
+
+    async def run(self, application, tokens, connections):
+        path = reverse('balance_events')
+        user_ids = list(tokens)
+        started = 0
+        all_started = asyncio.Event()
+        refused = []
+        received = 0
+        all_received = asyncio.Event()
+        disconnect = asyncio.Event()
+
+        async def connect(user_id):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {tokens[user_id]}'.encode())],
+                'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+            }
+            requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+            async def receive():
+                if requests:
+                    return requests.pop()
+                # An idle client: nothing more to say until the benchmark is over
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                nonlocal started, received
+                if message['type'] == 'http.response.start':
+                    if message['status'] != 200:
+                        refused.append(message['status'])
+                    started += 1
+                    if started == connections or refused:
+                        all_started.set()
+                elif message.get('body', b'').startswith(b'event: balance'):
+                    received += 1
+                    if received == connections:
+                        all_received.set()
+
+            await application(scope, receive, send)
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        tasks = [asyncio.create_task(connect(user_ids[i % len(user_ids)])) for i in range(connections)]
+        # Every stream has authenticated and subscribed once its headers are sent
+        await asyncio.wait_for(all_started.wait(), timeout=300)
+        if refused:
+            disconnect.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise CommandError(f"{path} answered {refused[0]}.")
+        await asyncio.sleep(0.5)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(
+            f"connections={connections} memory={(after - before) / 1024 / 1024:.1f}MiB "
+            f"per_connection={(after - before) / connections / 1024:.2f}KiB"
+        )
+
+        # Publish from another thread, like a sync view would
+        broker = get_broker()
+        start = time.perf_counter()
+        publisher = threading.Thread(target=lambda: [
+            broker.publish(user_id, {'event': 'balance', 'data': {'balance': '0.00'}}) for user_id in user_ids
+        ])
+        publisher.start()
+        await asyncio.wait_for(all_received.wait(), timeout=60)
+        publisher.join()
+        self.stdout.write(f"fan_out events={connections} seconds={time.perf_counter() - start:.3f}")
+
+        disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,54 @@
+import io
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from project.models import Balance, Customer
+from project.renderers import ORJSONParser, ORJSONRenderer, orjson
+from project.serializers import BalanceSerializer, UserProfileSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare JSON renderers and parsers on UserProfileSerializer and BalanceSerializer output."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--profiles', type=int, default=50, help="Customer profiles rendered per payload.")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed, ORJSONRenderer falls back to DRF's renderer."))
+
+        customers = Customer.objects.select_related('user')[:options['profiles']]
+        if not customers:
+            raise CommandError("There are no customers to render.")
+
+        # Serialize once, only the rendering is measured
+        payloads = {
+            'profile': UserProfileSerializer(customers, many=True).data,
+            'balances': BalanceSerializer(Balance.objects.select_related('user'), many=True).data,
+        }
+        renderers = {'drf': JSONRenderer(), 'orjson': ORJSONRenderer()}
+        parsers = {'drf': JSONParser(), 'orjson': ORJSONParser()}
+        iterations = options['iterations']
+
+        for name, data in payloads.items():
+            rendered = {key: renderer.render(data) for key, renderer in renderers.items()}
+            if rendered['drf'] != rendered['orjson']:
+                raise CommandError(f"Renderers disagree on the {name} payload.")
+            self.stdout.write(f"{name}: {len(rendered['drf'])} bytes")
+
+            for key, renderer in renderers.items():
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    renderer.render(data)
+                self.report(f"render {key}", time.perf_counter() - start, iterations)
+
+            for key, parser in parsers.items():
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    parser.parse(io.BytesIO(rendered['drf']))
+                self.report(f"parse {key}", time.perf_counter() - start, iterations)
+
+    def report(self, label, elapsed, iterations):
+        self.stdout.write(f"  {label:<14} {elapsed / iterations * 1e6:10.1f}us per payload")
@@ -0,0 +1,82 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from project.revocation import RevokedTokenSet
+
+PREFIX = 'bench-'
+
+
+class Command(BaseCommand):
+    help = "Compare database and in-memory revocation checks, optionally seeding fake outstanding tokens."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Fake outstanding tokens to create first.")
+        parser.add_argument('--revoked', type=float, default=0.1, help="Share of seeded tokens to blacklist.")
+        parser.add_argument('--expired', type=float, default=0.5, help="Share of seeded tokens already expired.")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Tokens per insert batch when seeding.")
+        parser.add_argument('--checks', type=int, default=5000)
+        parser.add_argument('--purge', action='store_true', help="Also time purge_tokens on the expired tokens.")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the fake tokens and exit.")
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = OutstandingToken.objects.filter(jti__startswith=PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS(f"{deleted} rows deleted."))
+            return
+
+        if options['seed']:
+            self.seed(options['seed'], options['revoked'], options['expired'], options['chunk_size'])
+
+        jtis = list(OutstandingToken.objects.order_by('?').values_list('jti', flat=True)[:1000])
+        if not jtis:
+            raise CommandError("There are no outstanding tokens, use --seed.")
+        checks = [random.choice(jtis) for _ in range(options['checks'])]
+        self.stdout.write(
+            f"outstanding={OutstandingToken.objects.count()} blacklisted={BlacklistedToken.objects.count()}"
+        )
+
+        start = time.perf_counter()
+        for jti in checks:
+            # The query simplejwt's own check_blacklist runs
+            BlacklistedToken.objects.filter(token__jti=jti).exists()
+        self.report('database', time.perf_counter() - start, len(checks))
+
+        revoked = RevokedTokenSet()
+        start = time.perf_counter()
+        revoked.rebuild()
+        self.stdout.write(f"  load       {(time.perf_counter() - start) * 1000:10.1f}ms for {len(revoked)} revoked tokens")
+        start = time.perf_counter()
+        for jti in checks:
+            revoked.is_revoked(jti)
+        self.report('in-memory', time.perf_counter() - start, len(checks))
+
+        if options['purge']:
+            call_command('purge_tokens', stdout=self.stdout)
+
+    def report(self, label, elapsed, count):
+        self.stdout.write(f"  {label:<10} {elapsed / count * 1e6:10.1f}us per check")
+
+    def seed(self, count, revoked_share, expired_share, chunk_size):
+        offset = OutstandingToken.objects.filter(jti__startswith=PREFIX).count()
+        now = timezone.now()
+        for chunk_start in range(offset, offset + count, chunk_size):
+            numbers = range(chunk_start, min(chunk_start + chunk_size, offset + count))
+            with transaction.atomic():
+                tokens = OutstandingToken.objects.bulk_create([
+                    OutstandingToken(
+                        jti=f'{PREFIX}{n}',
+                        token='',
+                        created_at=now,
+                        expires_at=now + timedelta(days=-1 if random.random() < expired_share else 1)
+                    )
+                    for n in numbers
+                ])
+                BlacklistedToken.objects.bulk_create([
+                    BlacklistedToken(token=token) for token in tokens if random.random() < revoked_share
+                ])
+            self.stdout.write(f"Seeded {numbers.stop - offset}/{count} tokens")
@@ -0,0 +1,102 @@
+import random
+import statistics
+import time
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from project.accounts import notify_accounts_changed
+from project.models import Customer
+from project.search import search_customers
+
+PREFIX = 'search-bench-'
+FIRST_NAMES = ['Ana', 'Carlos', 'Daniela', 'Jorge', 'Lucia', 'Miguel', 'Paula', 'Sofia', 'Andres', 'Valentina']
+LAST_NAMES = ['Garcia', 'Rodriguez', 'Martinez', 'Lopez', 'Gonzalez', 'Perez', 'Sanchez', 'Ramirez', 'Torres', 'Rojas']
+
+
+class Command(BaseCommand):
+    help = "Measure customer search latency, optionally seeding a fixture of fake customers first."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Fake customers to create before measuring.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Customers per insert batch when seeding.")
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--target-ms', type=float, default=100, help="p95 latency the search must stay under.")
+        parser.add_argument('--cleanup', action='store_true', help="Delete the fake customers and exit.")
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(username__startswith=PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS(f"{deleted} rows deleted."))
+            return
+
+        if options['seed']:
+            self.seed(options['seed'], options['chunk_size'])
+
+        samples = list(Customer.objects.order_by('?').select_related('user')[:100])
+        if not samples:
+            raise CommandError("There are no customers to search, use --seed.")
+
+        latencies = []
+        for _ in range(options['queries']):
+            query = self.random_query(random.choice(samples))
+            start = time.perf_counter()
+            # Same work as the endpoint's first page: the count and 20 rows
+            results = search_customers(query)
+            results.count()
+            list(results[:20])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+        summary = (
+            f"customers={Customer.objects.count()} queries={len(latencies)} "
+            f"p50={p50:.1f}ms p95={p95:.1f}ms p99={p99:.1f}ms target_p95={options['target_ms']:.0f}ms"
+        )
+        if p95 <= options['target_ms']:
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(self.style.ERROR(summary))
+
+    def random_query(self, customer):
+        """
+        Build a realistic partial query for a customer: a document or account
+        number fragment, or the start of a name.
+        """
+        kind = random.choice(['document', 'account', 'name'])
+        if kind == 'name':
+            name = random.choice([customer.user.first_name, customer.user.last_name]) or customer.document_number
+            return name[:random.randint(3, max(len(name), 3))]
+        value = customer.document_number if kind == 'document' else customer.account_number
+        length = random.randint(min(4, len(value)), len(value))
+        start = random.randint(0, len(value) - length)
+        return value[start:start + length]
+
+    def seed(self, count, chunk_size):
+        offset = User.objects.filter(username__startswith=PREFIX).count()
+        # Seeded users never log in, one unusable hash is enough for all of them
+        password = make_password(None)
+        for chunk_start in range(offset, offset + count, chunk_size):
+            numbers = range(chunk_start, min(chunk_start + chunk_size, offset + count))
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=f'{PREFIX}{n}',
+                        email=f'{PREFIX}{n}@example.com',
+                        first_name=random.choice(FIRST_NAMES),
+                        last_name=random.choice(LAST_NAMES),
+                        password=password
+                    )
+                    for n in numbers
+                ])
+                Customer.objects.bulk_create([
+                    Customer(
+                        user=user,
+                        document_type='CC',
+                        document_number=f'9{n:09d}',
+                        account_number=f'8{n:011d}'
+                    )
+                    for n, user in zip(numbers, users)
+                ])
+            self.stdout.write(f"Seeded {numbers.stop - offset}/{count} customers")
+        notify_accounts_changed()
@@ -0,0 +1,91 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so every import is paid again
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+modules = len(sys.modules)
+entry, path = sys.argv[1], sys.argv[2]
+if entry == 'wsgi':
+    from locatel_tech_finance.wsgi import application
+    imported = time.perf_counter()
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http',
+        'wsgi.input': __import__('io').BytesIO(), 'wsgi.errors': sys.stderr,
+    }
+    statuses = []
+    body = b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    status = int(statuses[0].split()[0])
+else:
+    import asyncio
+    from locatel_tech_finance.asgi import application
+    imported = time.perf_counter()
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 1234),
+    }
+    messages = []
+    requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # The client never disconnects, Django cancels this wait once it has responded
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    status = messages[0]['status']
+first_request = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'first_request': first_request - imported,
+    'modules': len(sys.modules) - modules,
+    'status': status,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = "Measure import time and time-to-first-request of the WSGI and ASGI entry points, full and API-only."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters started per combination.")
+        parser.add_argument('--path', default='/consignation/', help="Path of the first request.")
+
+    def handle(self, *args, **options):
+        for profile, api_only in (('full', ''), ('api-only', '1')):
+            for entry in ('wsgi', 'asgi'):
+                results = [self.probe(entry, options['path'], api_only) for _ in range(options['runs'])]
+                import_ms = statistics.median(result['import'] for result in results) * 1000
+                request_ms = statistics.median(result['first_request'] for result in results) * 1000
+                self.stdout.write(
+                    f"{profile:<8} {entry}  import={import_ms:7.1f}ms  first_request={request_ms:7.1f}ms  "
+                    f"total={import_ms + request_ms:7.1f}ms  modules={results[0]['modules']}  "
+                    f"status={results[0]['status']}"
+                )
+
+    def probe(self, entry, path, api_only):
+        env = {
+            **os.environ,
+            'DJANGO_API_ONLY': api_only,
+            # Keep the settings module this command runs with, e.g. a local override
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'locatel_tech_finance.settings'),
+        }
+        completed = subprocess.run(
+            [sys.executable, '-c', PROBE, entry, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise CommandError(f"The {entry} probe failed:\n{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
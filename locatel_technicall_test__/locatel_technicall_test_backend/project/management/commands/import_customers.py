@@ -0,0 +1,222 @@
+import csv
+import multiprocessing
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Q
+from project.accounts import notify_accounts_changed
+from project.batch import init_worker
+from project.models import Customer, Balance, Transaction
+
+REQUIRED_COLUMNS = ['first_name', 'last_name', 'email', 'password', 'document_type', 'document_number', 'account_number']
+
+
+class Command(BaseCommand):
+    help = "Import customers from a CSV file in bulk, with their balance and opening transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help=f"CSV with columns {', '.join(REQUIRED_COLUMNS)} and optional initial_balance.")
+        parser.add_argument('--errors', help="Per-row error file, defaults to <csv_path>.errors.csv.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Customers per database batch.")
+        parser.add_argument('--workers', type=int, default=4, help="Processes used to hash passwords.")
+
+    def handle(self, *args, **options):
+        errors_path = options['errors'] or f"{options['csv_path']}.errors.csv"
+        imported = 0
+        failed = 0
+        start_time = time.perf_counter()
+
+        with open(options['csv_path'], newline='', encoding='utf-8-sig') as source, \
+                open(errors_path, 'w', newline='') as errors_file, \
+                multiprocessing.Pool(options['workers'], initializer=init_worker) as pool:
+            reader = csv.DictReader(source)
+            missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+            if missing:
+                raise CommandError(f"Missing columns: {', '.join(missing)}")
+            errors = csv.writer(errors_file)
+            errors.writerow(['line', 'email', 'error'])
+
+            # Data lines start at 2, after the header
+            rows = enumerate(reader, start=2)
+            while chunk := list(islice(rows, options['chunk_size'])):
+                valid, rejected = self.validate_chunk(chunk)
+                if valid:
+                    hashes = pool.map(make_password, [row['password'] for _, row in valid], chunksize=64)
+                    written, write_rejected = self.write_valid(valid, hashes)
+                    imported += written
+                    rejected += write_rejected
+                errors.writerows(sorted(rejected))
+                failed += len(rejected)
+
+        elapsed = time.perf_counter() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f"{imported} customers imported, {failed} rejected in {elapsed:.2f}s "
+            f"({imported / elapsed if elapsed else 0:.0f} customers/s). Errors written to {errors_path}"
+        ))
+
+    def validate_chunk(self, chunk):
+        """
+        Check required fields, amounts, model field rules and duplicates for a
+        chunk of rows.
+
+        Duplicates are checked against the database with one query per unique
+        field for the whole chunk, and against the rest of the chunk in memory.
+        Earlier chunks are already committed, so the database check covers them.
+
+        Returns:
+            tuple: The valid (line, row) pairs and the rejected (line, email, error) rows.
+        """
+        valid = []
+        rejected = []
+        for line, row in chunk:
+            row = {key: (value or '').strip() for key, value in row.items() if key}
+            empty = [column for column in REQUIRED_COLUMNS if not row.get(column)]
+            if empty:
+                rejected.append((line, row.get('email', ''), f"Missing values: {', '.join(empty)}"))
+                continue
+            try:
+                row['initial_balance'] = Decimal(row.get('initial_balance') or '0.00').quantize(Decimal('0.01'))
+            except InvalidOperation:
+                row['initial_balance'] = None
+            if row['initial_balance'] is None or not row['initial_balance'].is_finite():
+                rejected.append((line, row['email'], "Invalid initial_balance"))
+                continue
+            if row['initial_balance'] < 0:
+                rejected.append((line, row['email'], "Negative initial_balance"))
+                continue
+            error = self.validate_fields(row)
+            if error:
+                rejected.append((line, row['email'], error))
+                continue
+            valid.append((line, row))
+
+        emails = [row['email'] for _, row in valid]
+        documents = [row['document_number'] for _, row in valid]
+        accounts = [row['account_number'] for _, row in valid]
+        taken = {
+            'email': {
+                value for pair in User.objects.filter(Q(username__in=emails) | Q(email__in=emails))
+                .values_list('username', 'email') for value in pair
+            },
+            'document_number': set(Customer.objects.filter(document_number__in=documents)
+                                   .values_list('document_number', flat=True)),
+            'account_number': set(Customer.objects.filter(account_number__in=accounts)
+                                  .values_list('account_number', flat=True)),
+        }
+
+        unique = []
+        for line, row in valid:
+            duplicated = [field for field, values in taken.items() if row[field] in values]
+            if duplicated:
+                rejected.append((line, row['email'], f"Already exists: {', '.join(duplicated)}"))
+                continue
+            for field, values in taken.items():
+                values.add(row[field])
+            unique.append((line, row))
+        return unique, rejected
+
+    def validate_fields(self, row):
+        """
+        Run the model field validation of the rows a customer becomes, e.g.
+        max_length, email format or decimal digits, so a bad row is rejected on
+        its own instead of failing the whole chunk's insert.
+
+        Returns:
+            str: The validation errors, or None if the row is valid.
+        """
+        instances = [
+            (User(username=row['email'], email=row['email'], first_name=row['first_name'],
+                  last_name=row['last_name']), ['password']),
+            (Customer(document_type=row['document_type'], document_number=row['document_number'],
+                      account_number=row['account_number']), ['user']),
+            (Balance(balance=row['initial_balance']), ['user']),
+        ]
+        errors = []
+        for instance, exclude in instances:
+            try:
+                # Uniqueness is checked for the whole chunk by validate_chunk
+                instance.full_clean(exclude=exclude, validate_unique=False)
+            except ValidationError as exc:
+                errors += [f"{field}: {' '.join(messages)}" for field, messages in exc.message_dict.items()]
+        return '; '.join(errors) or None
+
+    def write_valid(self, valid, hashes):
+        """
+        Write the valid rows of a chunk in one batch. A row conflicting with data
+        written since validate_chunk, e.g. a /register/ for the same email, fails
+        the batch; the chunk is then written row by row and only the
+        conflicting rows are rejected.
+
+        Returns:
+            tuple: The number of imported rows and the rejected (line, email, error) rows.
+        """
+        try:
+            self.write_chunk(valid, hashes)
+            return len(valid), []
+        except IntegrityError:
+            pass
+        except DatabaseError as exc:
+            return 0, [(line, row['email'], f"Batch failed: {exc}") for line, row in valid]
+
+        imported = 0
+        rejected = []
+        for (line, row), password in zip(valid, hashes):
+            try:
+                self.write_chunk([(line, row)], [password])
+                imported += 1
+            except IntegrityError as exc:
+                rejected.append((line, row['email'], f"Already exists: {exc}"))
+            except DatabaseError as exc:
+                rejected.append((line, row['email'], f"Insert failed: {exc}"))
+        return imported, rejected
+
+    def write_chunk(self, valid, hashes):
+        """
+        Insert users, customers, balances and opening transactions of a chunk.
+        """
+        rows = [row for _, row in valid]
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(
+                    username=row['email'],
+                    email=row['email'],
+                    password=password,
+                    first_name=row['first_name'],
+                    last_name=row['last_name']
+                )
+                for row, password in zip(rows, hashes)
+            ])
+            if not connection.features.can_return_rows_from_bulk_insert:
+                ids = dict(User.objects.filter(username__in=[row['email'] for row in rows]).values_list('username', 'id'))
+                for user in users:
+                    user.id = ids[user.username]
+
+            Customer.objects.bulk_create([
+                Customer(
+                    user=user,
+                    document_type=row['document_type'],
+                    document_number=row['document_number'],
+                    account_number=row['account_number']
+                )
+                for user, row in zip(users, rows)
+            ])
+            Balance.objects.bulk_create([
+                Balance(user=user, balance=row['initial_balance']) for user, row in zip(users, rows)
+            ])
+            Transaction.objects.bulk_create([
+                Transaction(
+                    user_receptor=user,
+                    user_emisor=row['document_number'],
+                    is_add=True,
+                    type='consignation',
+                    amount=row['initial_balance']
+                )
+                for user, row in zip(users, rows)
+            ])
+            # bulk_create sends no signals, let the running servers load the new accounts
+            transaction.on_commit(notify_accounts_changed)
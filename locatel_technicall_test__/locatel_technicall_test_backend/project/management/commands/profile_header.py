@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from project.profiling import CPROFILE, EXTENSIONS, get_options, sign_profile_request
+
+
+class Command(BaseCommand):
+    help = "Print a signed header that makes the profiling middleware profile a request."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=list(EXTENSIONS), default=CPROFILE)
+
+    def handle(self, *args, **options):
+        profiling = get_options()
+        self.stdout.write(f"{profiling['HEADER']}: {sign_profile_request(options['mode'])}")
+        self.stdout.write(f"Valid for {profiling['HEADER_MAX_AGE']} seconds.")
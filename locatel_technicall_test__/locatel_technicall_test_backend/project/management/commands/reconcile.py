@@ -0,0 +1,79 @@
+import csv
+import time
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from project.batch import id_chunks, run_in_pool
+from project.models import Transaction, ReconciliationRun
+from project.reconcile import reconcile_accounts
+
+
+class Command(BaseCommand):
+    help = "Check that every balance equals the net of its transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', help="Discrepancy report path, defaults to reconcile-<timestamp>.csv.")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Accounts per chunk.")
+        parser.add_argument('--workers', type=int, default=1, help="Parallel worker processes.")
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help="Only check accounts with transactions since the last finished run."
+        )
+        parser.add_argument(
+            '--overlap', type=int, default=600,
+            help="Seconds before the last run's start also rechecked with --incremental, covering "
+                 "transactions stamped before it started but committed after it read their account."
+        )
+
+    def handle(self, *args, **options):
+        started_at = timezone.now()
+        report = options['report'] or f"reconcile-{started_at:%Y%m%d%H%M%S}.csv"
+        tasks = self.build_tasks(options)
+        # Recorded up front, a run that does not finish keeps finished_at empty
+        run = ReconciliationRun.objects.create(
+            started_at=started_at, incremental=options['incremental'], report=report
+        )
+
+        accounts = 0
+        discrepancies = 0
+        start_time = time.perf_counter()
+        with open(report, 'w', newline='') as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(['user_id', 'balance', 'ledger_net', 'difference'])
+            for checked, rows in run_in_pool(reconcile_accounts, tasks, options['workers']):
+                accounts += checked
+                discrepancies += len(rows)
+                for user_id, balance, net in rows:
+                    writer.writerow([user_id, balance, net, (balance or 0) - net])
+        elapsed = time.perf_counter() - start_time
+
+        run.finished_at = timezone.now()
+        run.accounts = accounts
+        run.discrepancies = discrepancies
+        run.save(update_fields=['finished_at', 'accounts', 'discrepancies'])
+        style = self.style.ERROR if discrepancies else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{accounts} accounts checked in {elapsed:.2f}s, {discrepancies} discrepancies written to {report}"
+        ))
+
+    def build_tasks(self, options):
+        chunk_size = options['chunk_size']
+        last_run = ReconciliationRun.objects.filter(finished_at__isnull=False).order_by('-started_at').first()
+        if not options['incremental'] or last_run is None:
+            if options['incremental']:
+                self.stdout.write("No previous run, checking every account.")
+            return [(start, end, None) for start, end in id_chunks(User, chunk_size)]
+
+        # Every balance mutation records a transaction, so touched accounts are
+        # the ones with transactions since the previous run started. Dates are
+        # stamped before commit, so a transaction stamped just before that run
+        # started may have committed after it read the account: look back further.
+        since = last_run.started_at - timedelta(seconds=options['overlap'])
+        touched = sorted(
+            Transaction.objects.filter(transaction_date__gte=since)
+            .values_list('user_receptor_id', flat=True)
+            .distinct()
+            .order_by()
+        )
+        return [(None, None, touched[i:i + chunk_size]) for i in range(0, len(touched), chunk_size)]
@@ -0,0 +1,38 @@
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand
+from project.batch import run_in_pool
+from project.scheduling import EXECUTED, FAILED, RETRY, SKIPPED, drain_due_transfers
+
+
+class Command(BaseCommand):
+    help = "Execute due scheduled transfers. Several copies can run at once, on one or many hosts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Orders locked and run per transaction.")
+        parser.add_argument('--workers', type=int, default=1, help="Worker processes per tick.")
+        parser.add_argument('--mode', choices=['pessimistic', 'optimistic'], help="Balance concurrency mode.")
+        parser.add_argument('--loop', action='store_true', help="Keep running ticks instead of exiting after one.")
+        parser.add_argument('--sleep', type=float, default=5, help="Seconds between ticks with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            self.tick(options)
+            if not options['loop']:
+                return
+            time.sleep(options['sleep'])
+
+    def tick(self, options):
+        start_time = time.perf_counter()
+        tasks = [(options['batch_size'], options['mode'])] * options['workers']
+        totals = Counter()
+        for stats in run_in_pool(drain_due_transfers, tasks, options['workers']):
+            totals.update(stats)
+        elapsed = time.perf_counter() - start_time
+
+        done = totals[EXECUTED] + totals[FAILED]
+        self.stdout.write(
+            f"picked={totals['picked']} executed={totals[EXECUTED]} failed={totals[FAILED]} "
+            f"retry={totals[RETRY]} skipped={totals[SKIPPED]} in {elapsed:.2f}s "
+            f"({done / elapsed if elapsed else 0:.0f} orders/s)"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0006_rename_state_transaction_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balance',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
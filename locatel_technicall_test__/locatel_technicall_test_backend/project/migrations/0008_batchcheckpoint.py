@@ -0,0 +1,26 @@
+# Generated by Django 5.0.4 on 2026-10-19 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0007_balance_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100)),
+                ('chunk_start', models.BigIntegerField()),
+                ('rows', models.IntegerField(default=0)),
+                ('processed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('job', 'chunk_start')},
+            },
+        ),
+    ]
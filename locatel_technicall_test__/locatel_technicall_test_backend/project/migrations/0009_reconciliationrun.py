@@ -0,0 +1,30 @@
+# Generated by Django 5.0.4 on 2026-10-19 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0008_batchcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('incremental', models.BooleanField(default=False)),
+                ('accounts', models.IntegerField(default=0)),
+                ('discrepancies', models.IntegerField(default=0)),
+                ('report', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Expression indexes matching the UPPER(column::text) LIKE UPPER(...) SQL that
+# Django emits for icontains/istartswith on PostgreSQL
+TRIGRAM_INDEXES = [
+    ('project_customer_document_number_trgm', 'project_customer', 'document_number'),
+    ('project_customer_account_number_trgm', 'project_customer', 'account_number'),
+    ('project_auth_user_first_name_trgm', 'auth_user', 'first_name'),
+    ('project_auth_user_last_name_trgm', 'auth_user', 'last_name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('project', '0009_reconciliationrun'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+# simplejwt's outstanding token table has no index on expires_at, which the
+# purge_tokens command and the revoked token set filter on. The table belongs
+# to a third-party app, so the index is created with plain SQL.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+        ('project', '0010_customer_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS project_outstandingtoken_expires_at '
+            'ON token_blacklist_outstandingtoken (expires_at)',
+            'DROP INDEX IF EXISTS project_outstandingtoken_expires_at',
+        ),
+    ]
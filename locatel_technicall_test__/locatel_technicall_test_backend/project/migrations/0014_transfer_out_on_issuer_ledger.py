@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# Transfers used to record the issuer's transfer_out row on the receiver's
+# ledger, so every sender reconciled as a discrepancy. Move those rows to the
+# issuer, found by the document number stored in user_emisor. The old
+# placement is not worth restoring, so reversing is a no-op.
+
+
+def move_transfer_out_to_issuer(apps, schema_editor):
+    Customer = apps.get_model('project', 'Customer')
+    Transaction = apps.get_model('project', 'Transaction')
+    transfers_out = Transaction.objects.filter(type='transfer_out')
+    documents = transfers_out.values_list('user_emisor', flat=True).distinct()
+    issuers = Customer.objects.filter(document_number__in=documents).values_list('document_number', 'user_id')
+    for document_number, user_id in issuers.iterator():
+        (
+            transfers_out
+            .filter(user_emisor=document_number)
+            .exclude(user_receptor_id=user_id)
+            .update(user_receptor_id=user_id)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0013_batchjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_transfer_out_to_issuer, migrations.RunPython.noop),
+    ]
@@ -12,11 +12,65 @@ class Customer(models.Model):
 class Balance(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Bumped on every balance mutation, used to build ETags for conditional reads
+    version = models.PositiveBigIntegerField(default=0)
 
 class Transaction(models.Model):
     user_receptor = models.ForeignKey(User, on_delete=models.CASCADE)
     user_emisor = models.CharField(max_length=100)
     is_add = models.BooleanField()
-    transaction_date = models.DateTimeField(auto_now_add=True)
+    transaction_date = models.DateTimeField(auto_now_add=True, db_index=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    type = models.CharField(max_length=20)
\ No newline at end of file
+    type = models.CharField(max_length=20)
+class BatchJob(models.Model):
+    # Parameters of a batch job, a rerun must use the same ones to resume it safely
+    job = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=20)
+    value = models.CharField(max_length=40)
+    chunk_size = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class BatchCheckpoint(models.Model):
+    # One row per processed chunk, written in the same transaction as the chunk itself
+    job = models.CharField(max_length=100)
+    chunk_start = models.BigIntegerField()
+    rows = models.IntegerField(default=0)
+    processed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('job', 'chunk_start')
+
+class ReconciliationRun(models.Model):
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True)
+    incremental = models.BooleanField(default=False)
+    accounts = models.IntegerField(default=0)
+    discrepancies = models.IntegerField(default=0)
+    report = models.CharField(max_length=255, blank=True)
+
+class ScheduledTransfer(models.Model):
+    ONCE = 'once'
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    INTERVALS = [(ONCE, 'Once'), (DAILY, 'Daily'), (WEEKLY, 'Weekly'), (MONTHLY, 'Monthly')]
+
+    user_emisor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scheduled_transfers')
+    user_receptor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='incoming_scheduled_transfers')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    interval = models.CharField(max_length=10, choices=INTERVALS)
+    # First run; later runs are computed from it so monthly orders keep their day of month
+    start_at = models.DateTimeField()
+    next_run_at = models.DateTimeField()
+    active = models.BooleanField(default=True)
+    runs = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The workers' due order query only looks at active orders
+            models.Index(fields=['next_run_at'], condition=models.Q(active=True), name='scheduled_transfer_due_idx'),
+        ]
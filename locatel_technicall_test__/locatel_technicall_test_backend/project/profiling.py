@@ -0,0 +1,241 @@
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signing import BadSignature, TimestampSigner
+
+CPROFILE = 'cprofile'
+SAMPLER = 'sampler'
+EXTENSIONS = {CPROFILE: '.prof', SAMPLER: '.folded'}
+
+SIGNER_SALT = 'project.profiling'
+PROFILE_NAME = re.compile(r'^[\w.-]+\.(prof|folded)$')
+
+logger = logging.getLogger(__name__)
+
+# From Python 3.12 cProfile runs on sys.monitoring, which only one profiler in
+# the process can use at a time
+cprofile_lock = threading.Lock()
+
+
+def get_options():
+    return {
+        'ENABLED': False,
+        'HEADER': 'X-Profile',
+        'HEADER_MAX_AGE': 3600,
+        'SAMPLE_RATE': 0.0,
+        'MODE': SAMPLER,
+        'SAMPLER_INTERVAL': 0.005,
+        'DIRECTORY': settings.BASE_DIR / 'profiles',
+        'MAX_FILES': 200,
+        **getattr(settings, 'PROFILING', {}),
+    }
+
+
+def sign_profile_request(mode=CPROFILE):
+    """
+    Build a profiling header value that asks for one profiling mode.
+    """
+    return TimestampSigner(salt=SIGNER_SALT).sign(mode)
+
+
+class StackSampler:
+    """
+    Sample the stack of one thread from a background thread at a fixed interval.
+
+    The result is a count of each stack in the collapsed format read by
+    flame graph tools: 'module:function;module:function;...'. The profiled
+    thread is never traced, so the overhead is independent of how many
+    functions it calls.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        # Sample before the first wait, so even requests shorter than the interval show up
+        while True:
+            self._sample()
+            if self._stopped.wait(self.interval):
+                return
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+            frame = frame.f_back
+        if stack:
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f'{stack} {count}\n')
+
+
+def list_profiles():
+    """
+    List the stored profiles, newest first.
+
+    Returns:
+        list: A dict with the name, size in bytes and creation time of each profile.
+    """
+    directory = Path(get_options()['DIRECTORY'])
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in directory.iterdir():
+        if PROFILE_NAME.match(path.name):
+            stat = path.stat()
+            profiles.append({'name': path.name, 'size': stat.st_size, 'created': stat.st_mtime})
+    return sorted(profiles, key=lambda profile: profile['created'], reverse=True)
+
+
+def get_profile_path(name):
+    """
+    Return the path of a stored profile, or None if there is no such profile.
+    """
+    if not PROFILE_NAME.match(name):
+        return None
+    path = Path(get_options()['DIRECTORY']) / name
+    return path if path.is_file() else None
+
+
+def rotate_profiles(max_files):
+    for profile in list_profiles()[max_files:]:
+        try:
+            os.remove(Path(get_options()['DIRECTORY']) / profile['name'])
+        except FileNotFoundError:
+            pass
+
+
+class ProfilingMiddleware:
+    """
+    Profile single requests on demand and store the results on disk.
+
+    A request is profiled when it carries a valid signed PROFILING['HEADER'],
+    made with sign_profile_request and naming the mode, or when it is picked
+    at PROFILING['SAMPLE_RATE']. Modes are cProfile, which traces every call,
+    and a stack sampler with little overhead. Only PROFILING['MAX_FILES']
+    profiles are kept. Disabled, the middleware removes itself from the stack.
+
+    Only one request at a time is profiled with cProfile, concurrent ones fall
+    back to the sampler. From Python 3.12 cProfile also records the calls of
+    every other thread, so its profiles include requests served meanwhile; the
+    sampler only ever sees the profiled thread.
+
+    Async views are run through a thread by Django while this middleware is
+    enabled, so put it first in MIDDLEWARE to cover the whole request.
+    """
+
+    def __init__(self, get_response):
+        self.options = get_options()
+        if not self.options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + self.options['HEADER'].upper().replace('-', '_')
+        self.signer = TimestampSigner(salt=SIGNER_SALT)
+
+    def __call__(self, request):
+        mode = self.requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        if mode == CPROFILE and not cprofile_lock.acquire(blocking=False):
+            mode = SAMPLER
+        try:
+            return self.profile(request, mode)
+        finally:
+            if mode == CPROFILE:
+                cprofile_lock.release()
+
+    def profile(self, request, mode):
+        """
+        Serve a request under a profiler. Errors of the profiler itself never
+        fail the request, it is then served or returned without a profile.
+        """
+        try:
+            if mode == CPROFILE:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                profiler = StackSampler(threading.get_ident(), self.options['SAMPLER_INTERVAL'])
+                profiler.start()
+        except Exception:
+            logger.exception("Could not start the %s profiler", mode)
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            try:
+                if mode == CPROFILE:
+                    profiler.disable()
+                else:
+                    profiler.stop()
+            except Exception:
+                logger.exception("Could not stop the %s profiler", mode)
+
+        try:
+            response.headers['X-Profile-Id'] = self.store(request, mode, profiler, elapsed_ms)
+        except Exception:
+            logger.exception("Could not store the %s profile", mode)
+        return response
+
+    def requested_mode(self, request):
+        value = request.META.get(self.header)
+        if value:
+            try:
+                mode = self.signer.unsign(value, max_age=self.options['HEADER_MAX_AGE'])
+            except BadSignature:
+                return None
+            return mode if mode in EXTENSIONS else None
+        if self.options['SAMPLE_RATE'] and random.random() < self.options['SAMPLE_RATE']:
+            return self.options['MODE']
+        return None
+
+    def store(self, request, mode, profiler, elapsed_ms):
+        """
+        Write a profile and drop the oldest ones beyond PROFILING['MAX_FILES'].
+
+        Returns:
+            str: The name of the stored profile.
+        """
+        directory = Path(self.options['DIRECTORY'])
+        directory.mkdir(parents=True, exist_ok=True)
+        path_slug = re.sub(r'[^\w]+', '_', request.path).strip('_') or 'root'
+        name = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 1000000:06d}-"
+            f"{request.method}-{path_slug[:60]}-{elapsed_ms:.0f}ms{EXTENSIONS[mode]}"
+        )
+        # Write aside and rename so listings never see a partial file
+        partial = directory / f'.{name}.partial'
+        if mode == CPROFILE:
+            profiler.dump_stats(partial)
+        else:
+            profiler.dump(partial)
+        os.replace(partial, directory / name)
+        rotate_profiles(self.options['MAX_FILES'])
+        return name
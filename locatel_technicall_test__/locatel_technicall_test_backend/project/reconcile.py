@@ -0,0 +1,59 @@
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Sum, When
+from .models import Balance, Transaction
+
+LEDGER_AMOUNT = DecimalField(max_digits=20, decimal_places=2)
+
+
+def reconcile_accounts(task):
+    """
+    Compare the balances of a group of accounts with the net of their transactions.
+
+    Args:
+        task (tuple): (start, end, user_ids). Either a half-open user id range,
+                      or an explicit list of user ids when user_ids is not None.
+
+    Returns:
+        tuple: Number of accounts checked and the list of discrepancies as
+               (user_id, balance, ledger_net) tuples, balance being None when
+               the account has transactions but no balance row.
+    """
+    start, end, user_ids = task
+    if user_ids is not None:
+        scope = {'user_id__in': user_ids}
+    else:
+        scope = {'user_id__gte': start, 'user_id__lt': end}
+    transaction_scope = {key.replace('user_id', 'user_receptor_id'): value for key, value in scope.items()}
+
+    # Both reads see the same snapshot, operations committing in between would
+    # otherwise show up as discrepancies
+    with transaction.atomic():
+        if connection.vendor == 'postgresql' and not connection.savepoint_ids:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        balances = dict(Balance.objects.filter(**scope).values_list('user_id', 'balance'))
+        nets = list(
+            Transaction.objects.filter(**transaction_scope)
+            .values('user_receptor_id')
+            .annotate(net=Sum(
+                Case(When(is_add=True, then=F('amount')), default=-F('amount'), output_field=LEDGER_AMOUNT),
+                output_field=LEDGER_AMOUNT
+            ))
+            .values_list('user_receptor_id', 'net')
+            .order_by()
+        )
+
+    discrepancies = []
+    checked = set()
+    for user_id, net in nets:
+        checked.add(user_id)
+        balance = balances.get(user_id)
+        if balance != net:
+            discrepancies.append((user_id, balance, net))
+
+    # Balances without any transaction must be zero
+    for user_id, balance in balances.items():
+        if user_id not in checked and balance != 0:
+            discrepancies.append((user_id, balance, 0))
+
+    return len(checked | balances.keys()), discrepancies
@@ -0,0 +1,156 @@
+import heapq
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from .watermark import IdWatermark
+
+GENERATION_KEY = 'revoked_tokens_generation'
+
+
+class RevokedTokenSet:
+    """
+    In-process set of the jtis of blacklisted tokens that have not expired yet.
+
+    Entries are evicted once their token expires: an expired token is rejected
+    by its exp claim anyway. Tokens blacklisted by this process are added right
+    away; those blacklisted elsewhere are picked up by an incremental load,
+    triggered when the shared generation counter in TOKEN_REVOCATION['CACHE']
+    moves, or at most every TOKEN_REVOCATION['REFRESH_SECONDS']. Blacklist
+    rows that commit after a row with a higher id are still picked up, see
+    IdWatermark. Tokens taken off the blacklist stay revoked in running
+    processes until they restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._revoked = None
+        self._expiries = []
+        self._watermark = IdWatermark(self.options['GAP_SECONDS'])
+        self._generation = None
+        self._refreshed_at = 0
+
+    @property
+    def options(self):
+        return {'CACHE': None, 'REFRESH_SECONDS': 5, 'GAP_SECONDS': 3600, **getattr(settings, 'TOKEN_REVOCATION', {})}
+
+    def _shared_generation(self):
+        alias = self.options['CACHE']
+        if not alias:
+            return None
+        try:
+            return caches[alias].get(GENERATION_KEY)
+        except Exception:
+            return None
+
+    def rebuild(self):
+        """
+        Load every unexpired blacklisted token from the database.
+        """
+        with self._lock:
+            self._revoked = {}
+            self._expiries = []
+            self._watermark.reset()
+            self._load_new()
+
+    def _load_new(self):
+        self._generation = self._shared_generation()
+        # Loaded by id alone and filtered here: rows left out by the query
+        # would look like uncommitted ones to the watermark and be looked up again
+        rows = self._watermark.load(BlacklistedToken.objects.values_list('id', 'token__jti', 'token__expires_at'))
+        now = time.time()
+        for _row_id, jti, expires_at in rows:
+            if expires_at.timestamp() > now:
+                self._add(jti, expires_at.timestamp())
+        self._refreshed_at = time.monotonic()
+
+    def _add(self, jti, expires_at):
+        self._revoked[jti] = expires_at
+        heapq.heappush(self._expiries, (expires_at, jti))
+
+    def _evict_expired(self, now):
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._expiries)
+            if self._revoked.get(jti) == expires_at:
+                del self._revoked[jti]
+
+    def _maybe_refresh(self):
+        generation = self._shared_generation()
+        stale = time.monotonic() - self._refreshed_at >= self.options['REFRESH_SECONDS']
+        if generation != self._generation or stale:
+            self._load_new()
+
+    def is_revoked(self, jti):
+        with self._lock:
+            if self._revoked is None:
+                self.rebuild()
+            else:
+                self._maybe_refresh()
+            self._evict_expired(time.time())
+            return jti in self._revoked
+
+    def add(self, jti, expires_at):
+        """
+        Record a token blacklisted by this process.
+
+        Args:
+            jti (str): The token's jti claim.
+            expires_at (float): The token's exp claim, as a Unix timestamp.
+        """
+        with self._lock:
+            if self._revoked is not None:
+                self._add(jti, expires_at)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._revoked or ())
+
+
+revoked_tokens = RevokedTokenSet()
+
+
+def notify_tokens_revoked():
+    """
+    Tell the other processes' sets that tokens were blacklisted.
+    """
+    alias = revoked_tokens.options['CACHE']
+    if not alias:
+        return
+    try:
+        cache = caches[alias]
+        cache.add(GENERATION_KEY, 0, timeout=None)
+        cache.incr(GENERATION_KEY)
+    except Exception:
+        pass
+
+
+class CachedRevocationRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check is answered by the in-process revoked
+    token set instead of a query per check.
+    """
+
+    def check_blacklist(self):
+        if revoked_tokens.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        jti, expires_at = self.payload[api_settings.JTI_CLAIM], self.payload['exp']
+
+        def on_commit():
+            revoked_tokens.add(jti, expires_at)
+            notify_tokens_revoked()
+        transaction.on_commit(on_commit)
+        return result
+
+
+class CachedRevocationTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedRevocationRefreshToken
@@ -0,0 +1,151 @@
+import calendar
+import time
+from collections import Counter
+from datetime import timedelta
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+from .models import ScheduledTransfer
+from .services import ConcurrencyConflict, transfer
+from .throttling import account_velocity_charge, add_velocity, check_velocity
+
+EXECUTED = 'executed'
+FAILED = 'failed'
+RETRY = 'retry'
+SKIPPED = 'skipped'
+
+INTERVAL_DELTAS = {
+    ScheduledTransfer.DAILY: timedelta(days=1),
+    ScheduledTransfer.WEEKLY: timedelta(weeks=1),
+}
+
+
+def add_months(value, months):
+    """
+    Move a datetime by whole months, clamping the day to the end of shorter months.
+    """
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(order, now):
+    """
+    Find the first run of an order after now.
+
+    Runs missed while no worker was running are skipped rather than executed
+    in a burst, a standing order moves money once per period.
+
+    Returns:
+        datetime: The next run, or None if the order does not repeat.
+    """
+    start_at = order.start_at
+    if order.interval == ScheduledTransfer.ONCE:
+        return None
+    if order.interval == ScheduledTransfer.MONTHLY:
+        months = max((now.year - start_at.year) * 12 + now.month - start_at.month, 0)
+        occurrence = add_months(start_at, months)
+        return occurrence if occurrence > now else add_months(start_at, months + 1)
+    delta = INTERVAL_DELTAS[order.interval]
+    if now < start_at:
+        return start_at
+    return start_at + delta * ((now - start_at) // delta + 1)
+
+
+def error_message(exc):
+    if isinstance(exc, serializers.ValidationError):
+        detail = exc.detail
+        while isinstance(detail, (list, dict)) and detail:
+            detail = detail[0] if isinstance(detail, list) else next(iter(detail.values()))
+        return str(detail)[:255]
+    return str(exc)[:255]
+
+
+def execute_order(order, now, mode=None):
+    """
+    Run one due order and move it to its next run.
+
+    Claiming the order is a compare-and-swap on next_run_at in the same
+    savepoint as the transfer, so an order is executed once even on backends
+    without SKIP LOCKED. Rejected transfers, e.g. for insufficient funds or
+    over the sender's ACCOUNT_VELOCITY_LIMIT, count as a failed run. Lost
+    balance races and database errors leave the order due for the next tick.
+
+    Returns:
+        str: EXECUTED, FAILED, RETRY or SKIPPED when another worker claimed it.
+    """
+    next_run_at = next_occurrence(order, now)
+    schedule = {
+        'next_run_at': next_run_at or order.next_run_at,
+        'active': next_run_at is not None,
+        'last_run_at': now,
+    }
+    due = ScheduledTransfer.objects.filter(pk=order.pk, active=True, next_run_at=order.next_run_at)
+    try:
+        with transaction.atomic():
+            if not due.update(runs=F('runs') + 1, last_error='', **schedule):
+                return SKIPPED
+            # Standing orders count towards the sender's velocity like the API's transfers
+            velocity = account_velocity_charge(f'user:{order.user_emisor_id}', order.amount)
+            if velocity is not None and not check_velocity(velocity, time.time())[0]:
+                raise serializers.ValidationError("Límite de monto por periodo excedido.")
+            transfer(order.user_emisor, order.user_receptor, order.amount, mode)
+            if velocity is not None:
+                add_velocity(velocity)
+        return EXECUTED
+    except (serializers.ValidationError, ObjectDoesNotExist) as exc:
+        claimed = due.update(failures=F('failures') + 1, last_error=error_message(exc), **schedule)
+        return FAILED if claimed else SKIPPED
+    except (ConcurrencyConflict, DatabaseError):
+        return RETRY
+
+
+def run_due_batch(batch_size, mode=None):
+    """
+    Lock a batch of due orders with SELECT ... FOR UPDATE SKIP LOCKED and run them.
+
+    Orders locked by another worker are skipped, so any number of workers can
+    run side by side. The locks, and the balance locks taken by the transfers,
+    are held until the whole batch commits; smaller batches mean shorter waits
+    for the API.
+
+    Returns:
+        Counter: The number of picked orders and of each execute_order result.
+    """
+    now = timezone.now()
+    stats = Counter()
+    with transaction.atomic():
+        orders = list(
+            ScheduledTransfer.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('user_emisor', 'user_receptor')
+            .filter(active=True, next_run_at__lte=now)
+            .order_by('next_run_at')[:batch_size]
+        )
+        stats['picked'] = len(orders)
+        for order in orders:
+            stats[execute_order(order, now, mode)] += 1
+    return stats
+
+
+def drain_due_transfers(task):
+    """
+    Run batches until no due order is left for this worker.
+
+    Args:
+        task (tuple): The batch size and the balance concurrency mode.
+
+    Returns:
+        Counter: The totals over every batch.
+    """
+    batch_size, mode = task
+    totals = Counter()
+    while True:
+        stats = run_due_batch(batch_size, mode)
+        totals.update(stats)
+        # Orders left due for a retry would otherwise be picked again right away
+        if stats['picked'] == 0 or stats['picked'] == stats[RETRY] + stats[SKIPPED]:
+            return totals
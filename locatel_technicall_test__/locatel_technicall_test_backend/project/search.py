@@ -0,0 +1,55 @@
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from .models import Customer
+
+SEARCH_FIELDS = ['document_number', 'account_number', 'user__first_name', 'user__last_name']
+
+# pg_trgm extracts no trigram from shorter terms, their icontains would scan the table
+MIN_TERM_LENGTH = 3
+
+
+def search_customers(query):
+    """
+    Find customers by partial document number, account number or name.
+
+    Every word of the query must match one of the fields. On PostgreSQL the
+    icontains lookups are served by the trigram GIN indexes created in
+    migration 0010; other databases scan the table.
+
+    Results are ranked exact document or account matches first, then prefix
+    matches, then by trigram similarity on PostgreSQL, then by id.
+
+    Args:
+        query (str): The search text.
+
+    Returns:
+        QuerySet: The matching customers with their users.
+    """
+    terms = query.split()
+    customers = Customer.objects.select_related('user')
+    for term in terms:
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__icontains': term})
+        customers = customers.filter(condition)
+
+    first = terms[0] if terms else ''
+    prefix = Q()
+    for field in SEARCH_FIELDS:
+        prefix |= Q(**{f'{field}__istartswith': first})
+    customers = customers.annotate(rank=Case(
+        When(Q(document_number=query) | Q(account_number=query), then=Value(0)),
+        When(prefix, then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField()
+    ))
+
+    if connection.vendor == 'postgresql':
+        # Imported here, django.contrib.postgres is slow to import and only needed on PostgreSQL
+        from django.contrib.postgres.search import TrigramSimilarity
+        customers = customers.annotate(similarity=Greatest(
+            *(TrigramSimilarity(field, query) for field in SEARCH_FIELDS)
+        ))
+        return customers.order_by('rank', '-similarity', 'id')
+    return customers.order_by('rank', 'id')
@@ -1,7 +1,11 @@
 from django.db import transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import Customer, Balance, Transaction
+from .models import Customer, Balance, Transaction, ScheduledTransfer
+from .services import consign, withdraw, transfer
+from .accounts import account_index
+from datetime import timedelta
 from decimal import Decimal
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework import serializers
@@ -117,37 +121,22 @@ class ConsignationSerializer(serializers.Serializer):
     amount = serializers.DecimalField(write_only=True, max_digits=10, decimal_places=2)
 
     def validate_account_number(self, value):
-        # Check if the account number exists in the database
-        if not Customer.objects.filter(account_number=value).exists():
+        # Resolve the account through the in-memory index, unknown numbers never reach the database
+        self.receiver_account = account_index.resolve(value)
+        if self.receiver_account is None:
             raise serializers.ValidationError("Número de cuenta no encontrado.")
         return value
 
     def save(self):
         # Extract validated data
-        account_number = self.validated_data['account_number']
         user_emisor = self.validated_data['user_emisor']
         amount = self.validated_data['amount']
 
-        # Get the receiving customer from the account number
-        customer = Customer.objects.get(account_number=account_number)
-        user_receptor = customer.user
+        # Get the receiving user of the account resolved during validation
+        user_receptor = User.objects.get(pk=self.receiver_account.user_id)
 
-        # Create the transaction and update the balance within an atomic block
-        # to ensure that all actions are executed
-        with transaction.atomic():
-            # Create transacción
-            transaction_ = Transaction.objects.create(
-                user_receptor = user_receptor,
-                user_emisor = user_emisor,
-                is_add = True,
-                type = 'withdrawal',
-                amount = amount
-            )
-
-            # Get or create the balance for the receiving user
-            balance, _ = Balance.objects.get_or_create(user=user_receptor, defaults={'balance': Decimal('0.00')})
-            balance.balance += amount
-            balance.save()
+        # The transaction and the balance update are written in one atomic block
+        transaction_, _ = consign(user_receptor, user_emisor, amount, mode=self.context.get('concurrency_mode'))
 
         user_receptor_data = UserSerializer(user_receptor).data
         # Return transaction data
@@ -174,20 +163,8 @@ class WithdrawalSerializer(serializers.Serializer):
     def save(self):
         user = self.context['request'].user
         amount = self.validated_data['amount']
-        with transaction.atomic():
-            balance = Balance.objects.get(user=user)
-            balance.balance -= amount
-            balance.save()
-
-            transaction_ = Transaction.objects.create(
-                user_receptor=user,
-                user_emisor=user,
-                is_add=False,
-                type = 'withdrawal',
-                amount=amount
-            )
-            # Returns a tuple with the transaction object and the updated balance
-            return transaction_, balance.balance  
+        # Returns a tuple with the transaction object and the updated balance
+        return withdraw(user, amount, mode=self.context.get('concurrency_mode'))
 
 
 class TransferSerializer(serializers.Serializer):
@@ -198,18 +175,18 @@ class TransferSerializer(serializers.Serializer):
         user = self.context['request'].user
         amount = data['amount']
         account_number = data['account_number']
-        print(user)
-       # Get balance from the issuer directly, without checking if it exists, since it is assumed that you have an account.
+
+        # Verify existence of the receiving account before touching any balance
+        account = account_index.resolve(account_number)
+        if account is None:
+            raise serializers.ValidationError("El número de cuenta receptor no existe.")
+
+        # Get balance from the issuer directly, without checking if it exists, since it is assumed that you have an account.
         sender_balance = Balance.objects.get(user=user)
         if sender_balance.balance < amount:
-            print("if")
             raise serializers.ValidationError("Saldo insuficiente para realizar la transferencia.")
 
-        # Verify existence of the receiving user by account number
-        try:
-            receiver = Customer.objects.get(account_number=account_number).user
-        except Customer.DoesNotExist:
-            raise serializers.ValidationError("El número de cuenta receptor no existe.")
+        receiver = User.objects.get(pk=account.user_id)
 
         # Save the receiving user to use in the method save
         data['receiver'] = receiver
@@ -219,47 +196,54 @@ class TransferSerializer(serializers.Serializer):
         user_emisor = self.context['request'].user
         amount = self.validated_data['amount']
         user_receptor = self.validated_data['receiver']
+        return transfer(user_emisor, user_receptor, amount, mode=self.context.get('concurrency_mode'))
 
-        with transaction.atomic():
-            # Update issuer balance
-            sender_balance = Balance.objects.select_for_update().get(user=user_emisor)
-            sender_balance.balance -= amount
-            sender_balance.save()
-
-            # Update receiver balance
-            receiver_balance, created = Balance.objects.select_for_update().get_or_create(
-                user=user_receptor, defaults={'balance': 0}
-            )
-            receiver_balance.balance += amount
-            receiver_balance.save()
-            
-            # Get the issuer's document number
-            customer_emisor = Customer.objects.get(user=user_emisor)
-
-            # Record transaction to recipient
-            transaction_receptor = Transaction.objects.create(
-                user_receptor = user_receptor,
-                user_emisor = customer_emisor.document_number,
-                is_add = True,
-                type = 'transfer_add',
-                amount = amount
-            )
-
-            # Record transaction to issuer
-            transaction_emisor = Transaction.objects.create(
-                user_receptor = user_receptor,
-                user_emisor = customer_emisor.document_number,
-                is_add = False,
-                type = 'transfer_out',
-                amount = amount
-            )
-            return {
-                'user_emisor': user_emisor.id,
-                'user_receptor': user_receptor.id,
-                'amount': amount,
-                'balance': sender_balance.balance,
-                'date': transaction_emisor.transaction_date
-            }
+
+class ScheduledTransferSerializer(serializers.ModelSerializer):
+    account_number = serializers.CharField(max_length=100, write_only=True)
+    receptor_account_number = serializers.SerializerMethodField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    start_at = serializers.DateTimeField(required=False)
+
+    class Meta:
+        model = ScheduledTransfer
+        fields = [
+            'id', 'account_number', 'receptor_account_number', 'amount', 'interval', 'start_at',
+            'next_run_at', 'active', 'runs', 'failures', 'last_run_at', 'last_error'
+        ]
+        read_only_fields = ['next_run_at', 'active', 'runs', 'failures', 'last_run_at', 'last_error']
+
+    def get_receptor_account_number(self, obj):
+        return obj.user_receptor.customer.account_number
+
+    def validate(self, data):
+        user = self.context['request'].user
+
+        account = account_index.resolve(data['account_number'])
+        if account is None:
+            raise serializers.ValidationError("El número de cuenta receptor no existe.")
+        if account.user_id == user.id:
+            raise serializers.ValidationError("No puede programar transferencias a su propia cuenta.")
+
+        # Balances are checked on every run, the order only needs a start in the future
+        now = timezone.now()
+        start_at = data.get('start_at') or now
+        if start_at < now - timedelta(minutes=1):
+            raise serializers.ValidationError("La fecha de inicio no puede estar en el pasado.")
+
+        data['receiver_id'] = account.user_id
+        data['start_at'] = start_at
+        return data
+
+    def create(self, validated_data):
+        return ScheduledTransfer.objects.create(
+            user_emisor=self.context['request'].user,
+            user_receptor_id=validated_data['receiver_id'],
+            amount=validated_data['amount'],
+            interval=validated_data['interval'],
+            start_at=validated_data['start_at'],
+            next_run_at=validated_data['start_at']
+        )
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -297,6 +281,18 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return TransactionListSerializer(transactions, many=True).data
     
 
+class CustomerSearchSerializer(serializers.ModelSerializer):
+    full_name = serializers.SerializerMethodField()
+    email = serializers.EmailField(source='user.email', read_only=True)
+
+    class Meta:
+        model = Customer
+        fields = ['id', 'full_name', 'email', 'document_type', 'document_number', 'account_number']
+
+    def get_full_name(self, obj):
+        return f"{obj.user.first_name} {obj.user.last_name}"
+
+
 class TransactionListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
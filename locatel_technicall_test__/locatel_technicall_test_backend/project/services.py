@@ -0,0 +1,213 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from .models import Customer, Balance, Transaction
+from .events import notify_transaction
+
+PESSIMISTIC = 'pessimistic'
+OPTIMISTIC = 'optimistic'
+
+
+class ConcurrencyConflict(APIException):
+    """
+    Raised when an optimistic update keeps losing the race for a balance.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "La cuenta fue modificada por otra operación, intente de nuevo."
+    default_code = 'concurrency_conflict'
+
+
+class StaleBalance(Exception):
+    """
+    Internal signal that a compare-and-swap found a newer balance version.
+    """
+
+
+def get_concurrency_mode(mode=None):
+    """
+    Resolve the concurrency mode, falling back to the project setting.
+    """
+    mode = mode or getattr(settings, 'BALANCE_CONCURRENCY_MODE', PESSIMISTIC)
+    if mode not in (PESSIMISTIC, OPTIMISTIC):
+        raise ValueError(f"Unknown balance concurrency mode: {mode}")
+    return mode
+
+
+def run_with_retry(mode, operation):
+    """
+    Run a balance operation inside a transaction, retrying stale optimistic updates.
+
+    Args:
+        mode (str): PESSIMISTIC or OPTIMISTIC.
+        operation (callable): Receives the mode and performs the writes.
+
+    Returns:
+        The value returned by the operation.
+    """
+    attempts = getattr(settings, 'BALANCE_OPTIMISTIC_RETRIES', 5) if mode == OPTIMISTIC else 1
+    for _ in range(attempts):
+        try:
+            with transaction.atomic():
+                return operation(mode)
+        except StaleBalance:
+            continue
+    raise ConcurrencyConflict()
+
+
+def debit_balance(user, amount, mode, error_message):
+    """
+    Subtract an amount from a user's balance.
+
+    In pessimistic mode the row is locked until the surrounding transaction ends.
+    In optimistic mode the row is read without locks and written back only if
+    its version did not change in between.
+
+    Returns:
+        Decimal: The balance after the debit.
+    """
+    if mode == OPTIMISTIC:
+        balance = Balance.objects.get(user=user)
+        if balance.balance < amount:
+            raise serializers.ValidationError(error_message)
+        updated = Balance.objects.filter(pk=balance.pk, version=balance.version).update(
+            balance=F('balance') - amount,
+            version=F('version') + 1
+        )
+        if not updated:
+            raise StaleBalance()
+        return balance.balance - amount
+
+    balance = Balance.objects.select_for_update().get(user=user)
+    if balance.balance < amount:
+        raise serializers.ValidationError(error_message)
+    balance.balance -= amount
+    balance.version += 1
+    balance.save()
+    return balance.balance
+
+
+def credit_balance(user, amount, mode):
+    """
+    Add an amount to a user's balance, creating the balance if needed.
+
+    Returns:
+        Decimal: The balance after the credit.
+    """
+    if mode == OPTIMISTIC:
+        balance, _ = Balance.objects.get_or_create(user=user, defaults={'balance': 0})
+        # Credits commute, so an atomic increment is enough and never conflicts
+        Balance.objects.filter(pk=balance.pk).update(
+            balance=F('balance') + amount,
+            version=F('version') + 1
+        )
+        return Balance.objects.filter(pk=balance.pk).values_list('balance', flat=True).get()
+
+    balance, _ = Balance.objects.select_for_update().get_or_create(user=user, defaults={'balance': 0})
+    balance.balance += amount
+    balance.version += 1
+    balance.save()
+    return balance.balance
+
+
+def consign(user, user_emisor, amount, mode=None):
+    """
+    Deposit money into a user's balance on behalf of an external issuer.
+
+    Args:
+        user (User): The user receiving the money.
+        user_emisor (str): Who made the deposit, as given by the client.
+        amount (Decimal): The amount to deposit.
+        mode (str, optional): PESSIMISTIC or OPTIMISTIC, defaults to the project setting.
+
+    Returns:
+        tuple: The consignation transaction and the updated balance amount.
+    """
+    def operation(mode):
+        balance = credit_balance(user, amount, mode)
+        transaction_ = Transaction.objects.create(
+            user_receptor=user,
+            user_emisor=user_emisor,
+            is_add=True,
+            type='withdrawal',
+            amount=amount
+        )
+        notify_transaction(user.id, transaction_, balance)
+        return transaction_, balance
+
+    return run_with_retry(get_concurrency_mode(mode), operation)
+
+
+def withdraw(user, amount, mode=None):
+    """
+    Withdraw money from a user's balance.
+
+    Returns:
+        tuple: The withdrawal transaction and the updated balance amount.
+    """
+    def operation(mode):
+        balance = debit_balance(user, amount, mode, "Saldo insuficiente para el retiro.")
+        transaction_ = Transaction.objects.create(
+            user_receptor=user,
+            user_emisor=user,
+            is_add=False,
+            type='withdrawal',
+            amount=amount
+        )
+        notify_transaction(user.id, transaction_, balance)
+        return transaction_, balance
+
+    return run_with_retry(get_concurrency_mode(mode), operation)
+
+
+def transfer(user_emisor, user_receptor, amount, mode=None):
+    """
+    Move money from one user to another and record both sides of the transfer.
+
+    Args:
+        user_emisor (User): The user sending the money.
+        user_receptor (User): The user receiving the money.
+        amount (Decimal): The amount to transfer.
+        mode (str, optional): PESSIMISTIC or OPTIMISTIC, defaults to the project setting.
+
+    Returns:
+        dict: Sender and receiver ids, amount, sender balance and transaction date.
+    """
+    # Read before locking anything, the issuer's document number never changes
+    document_number = Customer.objects.filter(user=user_emisor).values_list('document_number', flat=True).get()
+
+    def operation(mode):
+        sender_balance = debit_balance(
+            user_emisor, amount, mode, "Saldo insuficiente para realizar la transferencia."
+        )
+        receiver_balance = credit_balance(user_receptor, amount, mode)
+
+        # Record transaction to recipient
+        transaction_receptor = Transaction.objects.create(
+            user_receptor=user_receptor,
+            user_emisor=document_number,
+            is_add=True,
+            type='transfer_add',
+            amount=amount
+        )
+
+        # Record transaction to issuer, on the issuer's own ledger
+        transaction_emisor = Transaction.objects.create(
+            user_receptor=user_emisor,
+            user_emisor=document_number,
+            is_add=False,
+            type='transfer_out',
+            amount=amount
+        )
+        notify_transaction(user_receptor.id, transaction_receptor, receiver_balance)
+        notify_transaction(user_emisor.id, transaction_emisor, sender_balance)
+        return {
+            'user_emisor': user_emisor.id,
+            'user_receptor': user_receptor.id,
+            'amount': amount,
+            'balance': sender_balance,
+            'date': transaction_emisor.transaction_date
+        }
+
+    return run_with_retry(get_concurrency_mode(mode), operation)
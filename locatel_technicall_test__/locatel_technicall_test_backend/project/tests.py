@@ -1,3 +1,861 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from . import profiling
+from .accounts import AccountIndex, account_index
+from .batch import FEE, INTEREST, apply_adjustment_chunk, id_chunks
+from .compression import CompressionMiddleware, negotiate_encoding, parse_accept_encoding
+from .etags import balances_etag, etag_matches
+from .events import LocalBroker, get_broker
+from .management.commands.import_customers import Command as ImportCustomersCommand
+from .models import Customer, Balance, Transaction, ScheduledTransfer, ReconciliationRun, BatchCheckpoint, BatchJob
+from .reconcile import reconcile_accounts
+from .renderers import ORJSONParser, ORJSONRenderer
+from .revocation import RevokedTokenSet
+from .scheduling import EXECUTED, FAILED, SKIPPED, execute_order
+from .search import search_customers
+from .services import OPTIMISTIC, PESSIMISTIC, ConcurrencyConflict, consign, transfer, withdraw
+from .throttling import AccountVelocityThrottle, IPTokenBucketThrottle, LocalBucketStore, get_bucket_store
+from .views import event_stream
+from .watermark import IdWatermark
 
-# Create your tests here.
+def create_customer(number, balance='0.00'):
+    """
+    Create a user with its customer and balance rows, without any transaction.
+    """
+    user = User.objects.create_user(username=f'user{number}@example.com', password='secret')
+    Customer.objects.create(
+        user=user, document_type='CC', document_number=f'DOC{number}', account_number=f'ACC{number}'
+    )
+    Balance.objects.create(user=user, balance=Decimal(balance))
+    return user
+
+
+def balance_of(user):
+    return Balance.objects.get(user=user).balance
+
+
+class BalanceOperationTests(TestCase):
+
+    def setUp(self):
+        self.emisor = create_customer(1, '100.00')
+        self.receptor = create_customer(2, '10.00')
+
+    def test_withdraw_debits_in_both_modes(self):
+        for mode in (PESSIMISTIC, OPTIMISTIC):
+            with self.subTest(mode=mode):
+                version = Balance.objects.get(user=self.emisor).version
+                transaction_, balance = withdraw(self.emisor, Decimal('10.00'), mode)
+                self.assertEqual(balance, balance_of(self.emisor))
+                self.assertEqual(transaction_.type, 'withdrawal')
+                self.assertFalse(transaction_.is_add)
+                self.assertEqual(Balance.objects.get(user=self.emisor).version, version + 1)
+        self.assertEqual(balance_of(self.emisor), Decimal('80.00'))
+
+    def test_transfer_debits_and_credits_in_both_modes(self):
+        for mode in (PESSIMISTIC, OPTIMISTIC):
+            with self.subTest(mode=mode):
+                result = transfer(self.emisor, self.receptor, Decimal('25.00'), mode)
+                self.assertEqual(result['balance'], balance_of(self.emisor))
+        self.assertEqual(balance_of(self.emisor), Decimal('50.00'))
+        self.assertEqual(balance_of(self.receptor), Decimal('60.00'))
+        # Each side of the transfer is on its own ledger
+        self.assertEqual(
+            Transaction.objects.filter(type='transfer_out', user_receptor=self.emisor, is_add=False).count(), 2
+        )
+        self.assertEqual(
+            Transaction.objects.filter(type='transfer_add', user_receptor=self.receptor, is_add=True).count(), 2
+        )
+
+    def test_consign_credits_in_both_modes(self):
+        for mode in (PESSIMISTIC, OPTIMISTIC):
+            with self.subTest(mode=mode):
+                version = Balance.objects.get(user=self.receptor).version
+                transaction_, balance = consign(self.receptor, 'DOC9', Decimal('5.00'), mode)
+                self.assertEqual(balance, balance_of(self.receptor))
+                self.assertTrue(transaction_.is_add)
+                self.assertEqual(Balance.objects.get(user=self.receptor).version, version + 1)
+        self.assertEqual(balance_of(self.receptor), Decimal('20.00'))
+
+    def test_consign_keeps_a_debit_committed_after_its_read(self):
+        get_or_create = Balance.objects.get_or_create
+
+        def racing_get_or_create(*args, **kwargs):
+            result = get_or_create(*args, **kwargs)
+            withdraw(self.receptor, Decimal('4.00'), PESSIMISTIC)
+            return result
+        with mock.patch.object(Balance.objects, 'get_or_create', side_effect=racing_get_or_create):
+            consign(self.receptor, 'DOC9', Decimal('5.00'), OPTIMISTIC)
+        self.assertEqual(balance_of(self.receptor), Decimal('11.00'))
+
+    def test_insufficient_funds_changes_nothing(self):
+        for mode in (PESSIMISTIC, OPTIMISTIC):
+            with self.subTest(mode=mode):
+                with self.assertRaises(serializers.ValidationError):
+                    withdraw(self.emisor, Decimal('100.01'), mode)
+                with self.assertRaises(serializers.ValidationError):
+                    transfer(self.emisor, self.receptor, Decimal('500.00'), mode)
+        self.assertEqual(balance_of(self.emisor), Decimal('100.00'))
+        self.assertEqual(balance_of(self.receptor), Decimal('10.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def bump_version_after_get(self, times):
+        """
+        Make the next reads of a balance look stale, as if another writer won
+        the race between the read and the compare-and-swap.
+        """
+        get = Balance.objects.get
+        calls = []
+
+        def stale_get(*args, **kwargs):
+            balance = get(*args, **kwargs)
+            if len(calls) < times:
+                calls.append(balance.pk)
+                Balance.objects.filter(pk=balance.pk).update(version=F('version') + 1)
+            return balance
+        return mock.patch.object(Balance.objects, 'get', side_effect=stale_get), calls
+
+    @override_settings(BALANCE_OPTIMISTIC_RETRIES=3)
+    def test_optimistic_debit_retries_a_stale_version(self):
+        patch, calls = self.bump_version_after_get(times=2)
+        with patch:
+            _, balance = withdraw(self.emisor, Decimal('10.00'), OPTIMISTIC)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(balance, Decimal('90.00'))
+        self.assertEqual(balance_of(self.emisor), Decimal('90.00'))
+
+    @override_settings(BALANCE_OPTIMISTIC_RETRIES=3)
+    def test_optimistic_debit_gives_up_with_concurrency_conflict(self):
+        patch, calls = self.bump_version_after_get(times=10)
+        with patch, self.assertRaises(ConcurrencyConflict):
+            transfer(self.emisor, self.receptor, Decimal('10.00'), OPTIMISTIC)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(balance_of(self.emisor), Decimal('100.00'))
+        self.assertEqual(balance_of(self.receptor), Decimal('10.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+
+class ETagTests(TestCase):
+
+    def test_balances_etag_changes_when_a_balance_is_replaced(self):
+        first = create_customer(1)
+        second = create_customer(2)
+        Balance.objects.filter(user=first).update(version=3)
+        before = balances_etag()
+        # Same count and version sum as before, with different balances
+        Balance.objects.filter(user=first).delete()
+        Balance.objects.create(user=first)
+        Balance.objects.filter(user=second).update(version=F('version') + 3)
+        self.assertNotEqual(balances_etag(), before)
+
+    def test_if_none_match_uses_weak_comparison(self):
+        factory = RequestFactory()
+        for header, matches in [('W/"a"', True), ('"a"', True), ('"b", W/"a"', True), ('*', True), ('"b"', False)]:
+            with self.subTest(header=header):
+                self.assertEqual(etag_matches(factory.get('/', HTTP_IF_NONE_MATCH=header), 'W/"a"'), matches)
+        self.assertFalse(etag_matches(factory.get('/'), 'W/"a"'))
+        self.assertFalse(etag_matches(factory.get('/', HTTP_IF_NONE_MATCH='*'), None))
+
+    @override_settings(COMPRESSION={'MIN_SIZE': 0})
+    def test_not_modified_repeats_the_compressed_tag(self):
+        for number in range(20):
+            create_customer(number)
+        client = APIClient()
+        response = client.get('/consignation/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        etag = response['ETag']
+
+        for header in (etag, etag.removeprefix('W/')):
+            with self.subTest(header=header):
+                response = client.get('/consignation/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+        Balance.objects.filter(user__username='user3@example.com').update(version=F('version') + 1)
+        response = client.get('/consignation/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class CustomerSearchTests(TestCase):
+
+    def setUp(self):
+        self.users = {}
+        for number, first_name, last_name in [(12, 'Ana', 'Diaz'), (123, 'Juan', 'Anaya'), (3, 'Mariana', 'Ruiz')]:
+            user = create_customer(number)
+            User.objects.filter(pk=user.pk).update(first_name=first_name, last_name=last_name)
+            self.users[number] = user
+
+    def found(self, query):
+        return [customer.account_number for customer in search_customers(query)]
+
+    def test_exact_then_prefix_then_other_matches(self):
+        self.assertEqual(self.found('ACC12'), ['ACC12', 'ACC123'])
+        # Ana and Anaya start with it, Mariana only contains it
+        self.assertEqual(self.found('ana'), ['ACC12', 'ACC123', 'ACC3'])
+        self.assertEqual(self.found('DOC3'), ['ACC3'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.found('ana diaz'), ['ACC12'])
+        self.assertEqual(self.found('ana nobody'), [])
+
+    def test_endpoint_is_staff_only_and_paginated(self):
+        client = APIClient()
+        client.force_authenticate(self.users[12])
+        self.assertEqual(client.get('/customers/search/', {'q': 'ana'}).status_code, 403)
+
+        User.objects.filter(pk=self.users[12].pk).update(is_staff=True)
+        client.force_authenticate(User.objects.get(pk=self.users[12].pk))
+        self.assertEqual(client.get('/customers/search/', {'q': 'a'}).status_code, 400)
+        self.assertEqual(client.get('/customers/search/', {'q': 'ana di'}).status_code, 400)
+        response = client.get('/customers/search/', {'q': 'ana', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([row['account_number'] for row in response.data['results']], ['ACC12', 'ACC123'])
+
+
+class ORJSONTests(SimpleTestCase):
+
+    def test_renders_like_drf(self):
+        payloads = [
+            {'amount': Decimal('10.50'), 'count': 3, 'ok': True, 'none': None, 'text': 'señal'},
+            {'date': datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc), 'id': uuid.UUID(int=1)},
+            {'naive': datetime(2026, 1, 2, 3, 4, 5), 'lazy': gettext_lazy('Token is blacklisted')},
+            {'separators': 'a\u2028b\u2029c', 'nested': [{'x': [1, 2.5]}], 1: 'int key'},
+            {'big': 2 ** 70},
+            [],
+        ]
+        for payload in payloads:
+            with self.subTest(payload=payload):
+                self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_indented_output_falls_back_to_drf(self):
+        payload = {'a': [1, 2]}
+        self.assertEqual(
+            ORJSONRenderer().render(payload, 'application/json; indent=2'),
+            JSONRenderer().render(payload, 'application/json; indent=2')
+        )
+
+    def test_parses_like_drf(self):
+        body = '{"amount": "1.50", "name": "señal", "list": [1, 2.5, null, true]}'.encode()
+        self.assertEqual(ORJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        for body in (b'{"a": NaN}', b'{"a": Infinity}', b'{not json'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                ORJSONParser().parse(BytesIO(body))
+
+
+class CompressionTests(SimpleTestCase):
+    codecs = {'gzip': None, 'br': None}
+
+    def test_accept_encoding_negotiation(self):
+        self.assertEqual(parse_accept_encoding('gzip;q=0.5, BR, zstd;q=bad, ,*;q=0'), {
+            'gzip': 0.5, 'br': 1.0, 'zstd': 0.0, '*': 0.0
+        })
+        cases = [
+            ('gzip, br', 'br'),
+            ('gzip', 'gzip'),
+            ('br;q=0, gzip', 'gzip'),
+            ('zstd', None),
+            ('*', 'br'),
+            ('*, br;q=0', 'gzip'),
+            ('identity', None),
+            ('', None),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(negotiate_encoding(header, ['zstd', 'br', 'gzip'], self.codecs), expected)
+
+    def compress(self, response, method='get', **headers):
+        request = getattr(RequestFactory(), method)('/', HTTP_ACCEPT_ENCODING='gzip', **headers)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    @override_settings(COMPRESSION={'ENCODINGS': ['gzip'], 'MIN_SIZE': 100})
+    def test_compresses_large_responses_and_weakens_strong_etags(self):
+        body = b'{"balance": "10.00"}' * 20
+        response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = '"v1"'
+        response = self.compress(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['ETag'], 'W/"v1"')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    @override_settings(COMPRESSION={'ENCODINGS': ['gzip'], 'MIN_SIZE': 100})
+    def test_leaves_small_unsafe_and_event_stream_responses_alone(self):
+        body = b'{"balance": "10.00"}' * 20
+        responses = [
+            self.compress(HttpResponse(b'{}', content_type='application/json')),
+            self.compress(HttpResponse(body, content_type='application/json'), method='post'),
+            self.compress(StreamingHttpResponse(iter([body]), content_type='text/event-stream')),
+        ]
+        for response in responses:
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(COMPRESSION={'ENCODINGS': ['gzip']})
+    def test_compresses_streams_chunk_by_chunk(self):
+        chunks = [b'{"a": 1}', b'{"b": 2}']
+        response = self.compress(StreamingHttpResponse(iter(chunks), content_type='application/json'))
+        compressed = list(response.streaming_content)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        # Every chunk is flushed, so the first one decodes on its own
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(compressed[0])).read1(), chunks[0])
+        self.assertEqual(gzip.decompress(b''.join(compressed)), b''.join(chunks))
+
+
+class APIOnlyProfileTests(SimpleTestCase):
+    # Settings are read once per process, so the profile is loaded in a fresh interpreter
+    probe = '''
+import json, django
+from django.apps import apps
+from django.conf import settings
+from django.urls import Resolver404, resolve
+django.setup()
+try:
+    resolve('/admin/')
+    admin = True
+except Resolver404:
+    admin = False
+print(json.dumps({
+    'apps': [app.name for app in apps.get_app_configs()],
+    'middleware': settings.MIDDLEWARE,
+    'renderers': settings.REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'],
+    'admin': admin,
+    'transfer': resolve('/transfer/').url_name,
+}))
+'''
+
+    def load_profile(self, api_only):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'locatel_tech_finance.settings', 'DJANGO_API_ONLY': api_only}
+        output = subprocess.run(
+            [sys.executable, '-c', self.probe], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout
+        return json.loads(output)
+
+    def test_api_only_profile_drops_browser_facing_apps(self):
+        profile = self.load_profile('1')
+        for app in ('django.contrib.admin', 'django.contrib.sessions', 'django.contrib.messages', 'django.contrib.staticfiles'):
+            self.assertNotIn(app, profile['apps'])
+        self.assertIn('rest_framework_simplejwt.token_blacklist', profile['apps'])
+        self.assertNotIn('django.middleware.csrf.CsrfViewMiddleware', profile['middleware'])
+        self.assertIn('corsheaders.middleware.CorsMiddleware', profile['middleware'])
+        self.assertEqual(profile['renderers'], ['project.renderers.ORJSONRenderer'])
+        self.assertFalse(profile['admin'])
+        self.assertEqual(profile['transfer'], 'transfer')
+
+    def test_full_profile_keeps_the_admin(self):
+        profile = self.load_profile('')
+        self.assertIn('django.contrib.admin', profile['apps'])
+        self.assertTrue(profile['admin'])
+
+
+class ScheduledTransferTests(TestCase):
+
+    def setUp(self):
+        self.emisor = create_customer(1, '100.00')
+        self.receptor = create_customer(2)
+        self.now = timezone.now()
+        self.order = ScheduledTransfer.objects.create(
+            user_emisor=self.emisor, user_receptor=self.receptor, amount=Decimal('10.00'),
+            interval=ScheduledTransfer.DAILY, start_at=self.now - timedelta(hours=1),
+            next_run_at=self.now - timedelta(hours=1)
+        )
+
+    def test_order_runs_once_when_claimed_twice(self):
+        # Both workers loaded the order before either of them ran it
+        first = ScheduledTransfer.objects.get(pk=self.order.pk)
+        second = ScheduledTransfer.objects.get(pk=self.order.pk)
+        self.assertEqual(execute_order(first, self.now), EXECUTED)
+        self.assertEqual(execute_order(second, self.now), SKIPPED)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.runs, 1)
+        self.assertEqual(self.order.next_run_at, self.order.start_at + timedelta(days=1))
+        self.assertEqual(balance_of(self.emisor), Decimal('90.00'))
+        self.assertEqual(balance_of(self.receptor), Decimal('10.00'))
+
+    def test_rejected_transfer_counts_as_a_failed_run(self):
+        ScheduledTransfer.objects.filter(pk=self.order.pk).update(amount=Decimal('500.00'))
+        self.order.refresh_from_db()
+        execute_order(self.order, self.now)
+
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.runs, self.order.failures), (0, 1))
+        self.assertEqual(self.order.last_error, "Saldo insuficiente para realizar la transferencia.")
+        self.assertEqual(balance_of(self.emisor), Decimal('100.00'))
+
+    @override_settings(ACCOUNT_VELOCITY_LIMIT={'amount': '15.00', 'window': 3600})
+    def test_runs_count_towards_the_sender_velocity(self):
+        get_bucket_store.cache_clear()
+        self.addCleanup(get_bucket_store.cache_clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(execute_order(self.order, self.now), EXECUTED)
+
+        self.order.refresh_from_db()
+        self.assertEqual(execute_order(self.order, self.order.next_run_at), FAILED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.last_error, "Límite de monto por periodo excedido.")
+        self.assertEqual(balance_of(self.emisor), Decimal('90.00'))
+
+        # The API's transfers share the same window
+        client = APIClient()
+        client.force_authenticate(self.emisor)
+        response = client.post('/transfer/', {'account_number': 'ACC2', 'amount': '6.00'}, format='json')
+        self.assertEqual(response.status_code, 429)
+
+
+class EventStreamTests(TestCase):
+
+    async def test_broker_drops_the_oldest_events_of_slow_subscribers(self):
+        broker = LocalBroker()
+        with override_settings(EVENTS_QUEUE_SIZE=2):
+            subscription, queue = broker.subscribe(1)
+        for number in range(3):
+            broker.publish(1, {'event': 'balance', 'data': number})
+        broker.publish(2, {'event': 'balance', 'data': 'other user'})
+        await asyncio.sleep(0)
+        self.assertEqual([queue.get_nowait()['data'] for _ in range(queue.qsize())], [1, 2])
+
+        broker.unsubscribe(1, subscription)
+        broker.publish(1, {'event': 'balance', 'data': 3})
+        await asyncio.sleep(0)
+        self.assertTrue(queue.empty())
+
+    async def test_stream_sends_events_and_ends_when_the_token_expires(self):
+        stream = event_stream(7, time.time() + 0.3)
+        self.assertEqual(await anext(stream), "retry: 5000\n\n")
+        # The first event subscribes the stream, publish once it waits for events
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        get_broker().publish(7, {'event': 'balance', 'data': {'balance': '1.00'}})
+        self.assertEqual(await pending, 'event: balance\ndata: {"balance": "1.00"}\n\n')
+        rest = [chunk async for chunk in stream]
+        self.assertEqual(rest[-1], "event: expired\ndata: {}\n\n")
+        self.assertTrue(all(chunk == ": keepalive\n\n" for chunk in rest[:-1]))
+        self.assertNotIn(7, get_broker()._subscribers)
+
+    def test_balance_changes_are_published_on_commit(self):
+        user = create_customer(1, '10.00')
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                withdraw(user, Decimal('4.00'))
+        self.assertEqual([call.args[1]['event'] for call in publish.call_args_list], ['transaction', 'balance'])
+        self.assertEqual(publish.call_args_list[1].args, (user.id, {'event': 'balance', 'data': {'balance': '6.00'}}))
+
+    def test_stream_needs_asgi(self):
+        self.assertEqual(APIClient().get('/events/').status_code, 501)
+
+
+class BatchAdjustmentTests(TestCase):
+
+    def setUp(self):
+        self.rich = create_customer(1, '200.00')
+        self.poor = create_customer(2, '3.00')
+        self.ids = sorted(Balance.objects.values_list('id', flat=True))
+        self.chunk = (self.ids[0], self.ids[-1] + 1)
+
+    def test_chunk_is_applied_once(self):
+        task = ('interest-1', INTEREST, '0.01', *self.chunk)
+        self.assertEqual(apply_adjustment_chunk(task), 2)
+        self.assertIsNone(apply_adjustment_chunk(task))
+        self.assertEqual(balance_of(self.rich), Decimal('202.00'))
+        self.assertEqual(balance_of(self.poor), Decimal('3.03'))
+        self.assertEqual(Transaction.objects.filter(type=INTEREST, is_add=True).count(), 2)
+
+    def test_fee_skips_balances_that_cannot_cover_it(self):
+        self.assertEqual(apply_adjustment_chunk(('fee-1', FEE, '5.00', *self.chunk)), 1)
+        self.assertEqual(balance_of(self.rich), Decimal('195.00'))
+        self.assertEqual(balance_of(self.poor), Decimal('3.00'))
+
+    def test_adjustment_errors_are_raised_and_leave_the_chunk_pending(self):
+        with mock.patch('project.batch.adjustment_sql', return_value=['INSERT INTO missing_table VALUES (%s)']):
+            with self.assertRaises(DatabaseError):
+                apply_adjustment_chunk(('interest-1', INTEREST, '0.01', *self.chunk))
+        self.assertFalse(BatchCheckpoint.objects.exists())
+
+    def test_rerun_must_use_the_same_parameters(self):
+        call_command('apply_adjustment', 'fee-1', FEE, '1.00', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('apply_adjustment', 'fee-1', FEE, '2.00', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('apply_adjustment', 'fee-1', FEE, '1.00', chunk_size=1, stdout=StringIO())
+
+        out = StringIO()
+        call_command('apply_adjustment', 'fee-1', FEE, '1.00', stdout=out)
+        self.assertIn('Resuming fee-1', out.getvalue())
+        self.assertEqual(balance_of(self.rich), Decimal('199.00'))
+
+    def test_resume_after_the_lowest_balance_is_deleted(self):
+        for number in range(3, 7):
+            create_customer(number, '100.00')
+        Balance.objects.update(balance=Decimal('100.00'))
+        BatchJob.objects.create(job='job1', kind=FEE, value='1', chunk_size=3)
+        # The run stopped after its first chunk
+        first = id_chunks(Balance, 3)[0]
+        apply_adjustment_chunk(('job1', FEE, '1', *first))
+        adjusted = set(Balance.objects.filter(balance=Decimal('99.00')).values_list('id', flat=True))
+        self.assertTrue(adjusted)
+
+        Balance.objects.filter(id=min(self.ids)).delete()
+        call_command('apply_adjustment', 'job1', FEE, '1', chunk_size=3, stdout=StringIO())
+        self.assertEqual(set(Balance.objects.values_list('balance', flat=True)), {Decimal('99.00')})
+
+    def test_unaligned_checkpoints_are_not_resumed(self):
+        BatchJob.objects.create(job='old', kind=FEE, value='1', chunk_size=10)
+        BatchCheckpoint.objects.create(job='old', chunk_start=7)
+        with self.assertRaises(CommandError):
+            call_command('apply_adjustment', 'old', FEE, '1', chunk_size=10, stdout=StringIO())
+
+
+class ReconcileTests(TestCase):
+
+    def test_known_ledger(self):
+        consistent = create_customer(1, '100.00')
+        receptor = create_customer(2)
+        Transaction.objects.create(
+            user_receptor=consistent, user_emisor='DOC1', is_add=True, type='consignation', amount=Decimal('100.00')
+        )
+        withdraw(consistent, Decimal('30.00'))
+        transfer(consistent, receptor, Decimal('20.00'))
+
+        drifted = create_customer(3, '50.00')
+        Transaction.objects.create(
+            user_receptor=drifted, user_emisor='DOC3', is_add=True, type='consignation', amount=Decimal('40.00')
+        )
+        unrecorded = create_customer(4, '10.00')
+        create_customer(5)
+
+        users = [consistent, receptor, drifted, unrecorded]
+        checked, discrepancies = reconcile_accounts((min(u.id for u in users), max(u.id for u in users) + 2, None))
+        self.assertEqual(checked, 5)
+        self.assertCountEqual(discrepancies, [
+            (drifted.id, Decimal('50.00'), Decimal('40.00')),
+            (unrecorded.id, Decimal('10.00'), 0),
+        ])
+
+        checked, discrepancies = reconcile_accounts((None, None, [consistent.id, receptor.id]))
+        self.assertEqual((checked, discrepancies), (2, []))
+
+    def test_incremental_run_rechecks_transactions_stamped_before_the_last_run(self):
+        report = tempfile.NamedTemporaryFile(suffix='.csv')
+        self.addCleanup(report.close)
+        late = create_customer(1, '5.00')
+        create_customer(2, '7.00')
+        call_command('reconcile', report=report.name, stdout=StringIO())
+        last_run = ReconciliationRun.objects.get()
+        self.assertEqual((last_run.accounts, last_run.discrepancies), (2, 2))
+        self.assertIsNotNone(last_run.finished_at)
+
+        # Stamped before the last run started, committed after it read the account
+        Transaction.objects.create(
+            user_receptor=late, user_emisor='DOC1', is_add=True, type='consignation', amount=Decimal('5.00')
+        )
+        Transaction.objects.filter(user_receptor=late).update(transaction_date=last_run.started_at - timedelta(seconds=5))
+        # Unfinished runs are not a starting point
+        ReconciliationRun.objects.create(started_at=timezone.now())
+
+        call_command('reconcile', report=report.name, incremental=True, stdout=StringIO())
+        run = ReconciliationRun.objects.filter(incremental=True).get()
+        self.assertEqual((run.accounts, run.discrepancies), (1, 0))
+
+
+class ImportCustomersTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv_path = f'{directory.name}/customers.csv'
+        header = 'first_name,last_name,email,password,document_type,document_number,account_number,initial_balance\n'
+        lines = [
+            'Ana,Diaz,ana@example.com,secret,CC,D1,A1,10.00',
+            'Luis,Paz,luis@example.com,secret,CC,D2,A2,abc',
+            'Eva,Rey,eva@example.com,secret,CC,D3,A3,',
+            'Ana,Bis,ana@example.com,secret,CC,D4,A4,',
+            'Leo,Sol,leo@example.com,secret,CC,D5,A5,5.00',
+            'Ivan,Mar,ivan@example.com,secret,CC,D6,A6,NaN',
+        ]
+        with open(self.csv_path, 'w') as source:
+            source.write(header + '\n'.join(lines) + '\n')
+
+    def run_import(self):
+        call_command('import_customers', self.csv_path, workers=1, stdout=StringIO())
+        with open(f'{self.csv_path}.errors.csv') as errors:
+            return [row.split(',')[:2] for row in errors.read().splitlines()[1:]]
+
+    def test_imports_valid_rows_and_reports_the_rest_in_line_order(self):
+        self.assertEqual(
+            self.run_import(),
+            [['3', 'luis@example.com'], ['5', 'ana@example.com'], ['7', 'ivan@example.com']]
+        )
+        self.assertEqual(Customer.objects.count(), 3)
+        self.assertEqual(balance_of(User.objects.get(email='ana@example.com')), Decimal('10.00'))
+
+    def test_conflict_after_validation_only_rejects_its_row(self):
+        write_chunk = ImportCustomersCommand.write_chunk
+
+        def racing_write_chunk(command, valid, hashes):
+            # A /register/ for the same email commits between validation and insert
+            if not User.objects.filter(email='eva@example.com').exists():
+                User.objects.create_user(username='eva@example.com', email='eva@example.com')
+            return write_chunk(command, valid, hashes)
+        with mock.patch.object(ImportCustomersCommand, 'write_chunk', racing_write_chunk):
+            errors = self.run_import()
+        self.assertEqual([line for line, _ in errors], ['3', '4', '5', '7'])
+        self.assertCountEqual(
+            Customer.objects.values_list('account_number', flat=True), ['A1', 'A5']
+        )
+
+
+class AccountIndexTests(TestCase):
+
+    def setUp(self):
+        self.index = AccountIndex()
+        create_customer(1)
+        self.index.rebuild()
+
+    @override_settings(ACCOUNT_INDEX={'REFRESH_SECONDS': 60})
+    def test_unknown_numbers_are_rejected_from_memory(self):
+        self.assertEqual(self.index.resolve('ACC1').user_id, User.objects.get(username='user1@example.com').pk)
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.index.resolve('NOPE'))
+
+    @override_settings(ACCOUNT_INDEX={'REFRESH_SECONDS': 0})
+    def test_accounts_created_by_another_process_are_found_on_a_miss(self):
+        # Created without this index hearing about it, as in another process
+        user = create_customer(2)
+        self.assertEqual(self.index.resolve('ACC2').user_id, user.pk)
+
+    def edit_account_number(self, old, new):
+        customer = Customer.objects.get(account_number=old)
+        customer.account_number = new
+        with self.captureOnCommitCallbacks(execute=True):
+            customer.save()
+        return customer
+
+    def test_edited_account_numbers_move_in_the_index(self):
+        account_index.rebuild()
+        customer = self.edit_account_number('ACC1', 'NEW1')
+        self.assertIsNone(account_index.resolve('ACC1'))
+        self.assertEqual(account_index.resolve('NEW1').customer_id, customer.id)
+
+    @override_settings(ACCOUNT_INDEX={'CACHE': 'default', 'REFRESH_SECONDS': 0})
+    def test_other_processes_see_edits_and_deletes(self):
+        account_index.rebuild()
+        create_customer(2)
+        self.index.rebuild()
+        self.assertIsNotNone(self.index.resolve('ACC2'))
+
+        customer = self.edit_account_number('ACC1', 'NEW1')
+        self.assertIsNone(self.index.resolve('ACC1'))
+        self.assertEqual(self.index.resolve('NEW1').customer_id, customer.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.filter(account_number='ACC2').get().delete()
+        self.assertIsNone(self.index.resolve('ACC2'))
+
+
+class IdWatermarkTests(TestCase):
+
+    def setUp(self):
+        self.users = [create_customer(number) for number in range(1, 4)]
+        self.rows = Customer.objects.values_list('id', 'account_number')
+
+    def test_rows_committed_below_the_watermark_are_loaded_later(self):
+        watermark = IdWatermark(gap_seconds=60)
+        late = Customer.objects.get(user=self.users[1])
+        # The middle row was not committed yet during the first load
+        first = list(watermark.load(self.rows.exclude(pk=late.pk)))
+        self.assertEqual([account for _, account in first], ['ACC1', 'ACC3'])
+        self.assertEqual(len(watermark), 1)
+
+        self.assertEqual(list(watermark.load(self.rows)), [(late.pk, 'ACC2')])
+        self.assertEqual(len(watermark), 0)
+        self.assertEqual(list(watermark.load(self.rows)), [])
+
+    def test_gaps_expire_and_are_capped(self):
+        watermark = IdWatermark(gap_seconds=0)
+        list(watermark.load(self.rows.exclude(user=self.users[1])))
+        self.assertEqual(len(watermark), 0)
+
+        watermark = IdWatermark(gap_seconds=60, max_gaps=1)
+        Customer.objects.filter(user=self.users[2]).update(id=F('id') + 10)
+        list(watermark.load(self.rows.exclude(user=self.users[1])))
+        self.assertEqual(len(watermark), 1)
+
+
+class RevokedTokenSetTests(TestCase):
+
+    def blacklist(self, jti, expires_in):
+        token = OutstandingToken.objects.create(
+            jti=jti, token=jti, expires_at=timezone.now() + timedelta(seconds=expires_in)
+        )
+        return BlacklistedToken.objects.create(token=token)
+
+    @override_settings(TOKEN_REVOCATION={'REFRESH_SECONDS': 0})
+    def test_loads_unexpired_tokens_without_gaps_for_expired_ones(self):
+        self.blacklist('expired-1', -60)
+        self.blacklist('live-1', 3600)
+        self.blacklist('expired-2', -60)
+        revoked = RevokedTokenSet()
+        self.assertTrue(revoked.is_revoked('live-1'))
+        self.assertFalse(revoked.is_revoked('expired-1'))
+        self.assertEqual((len(revoked), len(revoked._watermark)), (1, 0))
+
+        # Blacklisted by another process
+        self.blacklist('live-2', 3600)
+        self.assertTrue(revoked.is_revoked('live-2'))
+        self.assertEqual(len(revoked._watermark), 0)
+
+    def test_expired_entries_are_evicted(self):
+        revoked = RevokedTokenSet()
+        revoked.rebuild()
+        revoked.add('soon', time.time() - 1)
+        revoked.add('later', time.time() + 60)
+        self.assertFalse(revoked.is_revoked('soon'))
+        self.assertTrue(revoked.is_revoked('later'))
+        self.assertEqual(len(revoked), 1)
+
+
+class TokenBucketTests(TestCase):
+
+    def test_bucket_refills_at_its_rate(self):
+        store = LocalBucketStore()
+        self.assertEqual(store.consume('key', 2, 1.0, 100.0), (True, None))
+        self.assertEqual(store.consume('key', 2, 1.0, 100.0), (True, None))
+        self.assertEqual(store.consume('key', 2, 1.0, 100.0), (False, 1.0))
+        self.assertEqual(store.consume('key', 2, 1.0, 100.5), (False, 0.5))
+        self.assertEqual(store.consume('key', 2, 1.0, 101.0), (True, None))
+        # Never refills past its capacity
+        self.assertEqual(store.consume('other', 2, 1.0, 0.0), (True, None))
+        self.assertEqual(store.consume('other', 2, 1.0, 1000.0), (True, None))
+        self.assertEqual(store.consume('other', 2, 1.0, 1000.0), (True, None))
+        self.assertFalse(store.consume('other', 2, 1.0, 1000.0)[0])
+
+    def test_window_totals_roll_over(self):
+        store = LocalBucketStore()
+        store.add_to_window('key', 40, 60, 30.0)
+        self.assertEqual(store.window_totals('key', 60, 59.0), (40, 0))
+        self.assertEqual(store.window_totals('key', 60, 61.0), (0, 40))
+        self.assertEqual(store.window_totals('key', 60, 121.0), (0, 0))
+
+    def test_time_until_fits(self):
+        fits = AccountVelocityThrottle.time_until_fits
+        # The previous window's share of 100 drops to 30 after 12 more seconds
+        self.assertAlmostEqual(fits(30, 100, 60, 30, 40, 100), 12)
+        # The current window has to become the previous one and shrink to 70
+        self.assertAlmostEqual(fits(30, 100, 60, 30, 90, 0), 30 + 60 * 2 / 9)
+        self.assertIsNone(fits(101, 100, 60, 30, 0, 0))
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 0})
+    def test_ip_ignores_forwarded_for_without_proxies(self):
+        request = APIRequestFactory().post('/', HTTP_X_FORWARDED_FOR='1.2.3.4', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(IPTokenBucketThrottle().get_ident(request), '10.0.0.1')
+
+
+class MoneyThrottleTests(TestCase):
+
+    def setUp(self):
+        get_bucket_store.cache_clear()
+        self.addCleanup(get_bucket_store.cache_clear)
+        self.sender = create_customer(1, '100.00')
+        self.victim = create_customer(2, '100.00')
+        account_index.rebuild()
+        self.client = APIClient()
+
+    def consign(self, amount, ip='10.0.0.1'):
+        return self.client.post(
+            '/consignation/', {'account_number': 'ACC2', 'user_emisor': 'DOC9', 'amount': amount},
+            format='json', REMOTE_ADDR=ip
+        )
+
+    @mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'money_account': '2/min'})
+    def test_invalid_anonymous_requests_do_not_drain_the_target_bucket(self):
+        for i in range(5):
+            self.assertEqual(self.consign('junk', ip=f'10.0.1.{i}').status_code, 400)
+        self.assertEqual(self.consign('1.00').status_code, 201)
+        self.assertEqual(self.consign('1.00').status_code, 201)
+        self.assertEqual(self.consign('1.00').status_code, 429)
+
+        # The sender's transfers use the sender's own bucket
+        self.client.force_authenticate(self.sender)
+        response = self.client.post('/transfer/', {'account_number': 'ACC2', 'amount': '1.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ACCOUNT_VELOCITY_LIMIT={'amount': '10.00', 'window': 3600})
+    def test_velocity_is_shared_by_every_operation_of_an_account(self):
+        self.client.force_authenticate(self.victim)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/withdraw/', {'amount': '6.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.consign('5.00').status_code, 429)
+        self.assertEqual(self.consign('4.00').status_code, 201)
+
+
+class ProfilingMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = override_settings(PROFILING={'ENABLED': True, 'DIRECTORY': directory.name})
+        patch.enable()
+        self.addCleanup(patch.disable)
+        self.middleware = profiling.ProfilingMiddleware(lambda request: HttpResponse('ok'))
+
+    def request(self, mode):
+        return RequestFactory().get('/profile/', HTTP_X_PROFILE=profiling.sign_profile_request(mode))
+
+    def test_profiles_a_signed_request(self):
+        response = self.middleware(self.request(profiling.CPROFILE))
+        self.assertTrue(response['X-Profile-Id'].endswith('.prof'))
+        self.assertEqual([p['name'] for p in profiling.list_profiles()], [response['X-Profile-Id']])
+        self.assertNotIn('X-Profile-Id', self.middleware(RequestFactory().get('/profile/')))
+
+    def test_busy_cprofile_falls_back_to_the_sampler(self):
+        with profiling.cprofile_lock:
+            response = self.middleware(self.request(profiling.CPROFILE))
+        self.assertTrue(response['X-Profile-Id'].endswith('.folded'))
+        self.assertFalse(profiling.cprofile_lock.locked())
+
+    def test_profiler_errors_never_fail_the_request(self):
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError("Another profiling tool is already active")), \
+                self.assertLogs('project.profiling', 'ERROR'):
+            response = self.middleware(self.request(profiling.CPROFILE))
+        self.assertEqual((response.status_code, response.content), (200, b'ok'))
+        self.assertNotIn('X-Profile-Id', response)
+
+        with mock.patch.object(profiling.ProfilingMiddleware, 'store', side_effect=OSError), \
+                self.assertLogs('project.profiling', 'ERROR'):
+            response = self.middleware(self.request(profiling.SAMPLER))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(profiling.cprofile_lock.locked())
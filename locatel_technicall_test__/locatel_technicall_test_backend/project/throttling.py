@@ -0,0 +1,371 @@
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+from .accounts import account_index
+
+
+class LocalBucketStore:
+    """
+    Throttle state kept in process memory.
+
+    Every operation runs under a single lock, so it is atomic within the process.
+    Used when no shared cache is configured, or when the shared cache fails.
+    """
+    max_keys = 100000
+
+    def __init__(self):
+        self._buckets = {}
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, now):
+        """
+        Take one token from a bucket refilled at refill_rate tokens per second.
+
+        Returns:
+            tuple: Whether the token was granted, and the seconds to wait otherwise.
+        """
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if len(self._buckets) >= self.max_keys:
+                self._prune(self._buckets, now)
+            # The entry carries no state once the bucket is full again
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill_rate)
+        return (True, None) if allowed else (False, (1 - tokens) / refill_rate)
+
+    def window_totals(self, key, window, now):
+        """
+        Read the totals of the current and previous fixed windows.
+
+        Returns:
+            tuple: The current window's total and the previous window's total.
+        """
+        index = int(now // window)
+        with self._lock:
+            current_index, current, previous, _ = self._windows.get(key, (index, 0, 0, now))
+        if current_index == index:
+            return current, previous
+        return 0, current if current_index == index - 1 else 0
+
+    def add_to_window(self, key, amount, window, now):
+        """
+        Add an amount to the current fixed window's total.
+        """
+        index = int(now // window)
+        with self._lock:
+            current_index, current, previous, _ = self._windows.get(key, (index, 0, 0, now))
+            if current_index != index:
+                previous = current if current_index == index - 1 else 0
+                current = 0
+            if len(self._windows) >= self.max_keys:
+                self._prune(self._windows, now)
+            # Both windows have passed by then
+            self._windows[key] = (index, current + amount, previous, (index + 2) * window)
+
+    @staticmethod
+    def _prune(entries, now):
+        for key, entry in list(entries.items()):
+            if entry[-1] <= now:
+                del entries[key]
+
+
+class CacheBucketStore:
+    """
+    Throttle state kept in a shared Django cache, e.g. Redis or Memcached.
+
+    Bucket updates run under a short lock taken with cache.add, which is atomic
+    on shared backends. Window totals only use cache.incr. When the cache is
+    unavailable or the lock stays busy, the in-memory store answers instead.
+    """
+    lock_attempts = 3
+
+    def __init__(self, alias, fallback):
+        self.cache = caches[alias]
+        self.fallback = fallback
+
+    def consume(self, key, capacity, refill_rate, now):
+        lock_key = f'{key}:lock'
+        try:
+            for _ in range(self.lock_attempts):
+                if self.cache.add(lock_key, 1, timeout=1):
+                    break
+                time.sleep(0.001)
+            else:
+                return self.fallback.consume(key, capacity, refill_rate, now)
+            try:
+                tokens, updated = self.cache.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * refill_rate)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                # Expire once the bucket would be full again
+                self.cache.set(key, (tokens, now), timeout=int(capacity / refill_rate) + 1)
+            finally:
+                self.cache.delete(lock_key)
+        except Exception:
+            return self.fallback.consume(key, capacity, refill_rate, now)
+        return (True, None) if allowed else (False, (1 - tokens) / refill_rate)
+
+    def window_totals(self, key, window, now):
+        index = int(now // window)
+        current_key, previous_key = f'{key}:{index}', f'{key}:{index - 1}'
+        try:
+            totals = self.cache.get_many([current_key, previous_key])
+        except Exception:
+            return self.fallback.window_totals(key, window, now)
+        return totals.get(current_key, 0), totals.get(previous_key, 0)
+
+    def add_to_window(self, key, amount, window, now):
+        current_key = f'{key}:{int(now // window)}'
+        try:
+            self.cache.add(current_key, 0, timeout=window * 2)
+            self.cache.incr(current_key, amount)
+        except Exception:
+            self.fallback.add_to_window(key, amount, window, now)
+
+
+@lru_cache(maxsize=None)
+def get_bucket_store():
+    """
+    Return the process-wide throttle store selected by settings.THROTTLE_CACHE.
+    """
+    local = LocalBucketStore()
+    alias = getattr(settings, 'THROTTLE_CACHE', None)
+    if alias:
+        return CacheBucketStore(alias, local)
+    return local
+
+
+def request_value(request, name):
+    """
+    Read a field from the request body, which may not be a mapping at all.
+    """
+    data = request.data
+    return data.get(name) if hasattr(data, 'get') else None
+
+
+def account_key(request):
+    """
+    Identify the account a money request acts on: the authenticated user's own
+    account, or the target account for anonymous consignations. Both are keyed
+    by the account's user, so an account has a single key either way.
+    """
+    if request.user and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    account_number = request_value(request, 'account_number')
+    account = account_index.resolve(str(account_number)) if account_number else None
+    return f'user:{account.user_id}' if account else None
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket throttle. The scope's rate, e.g. '30/min', is both the burst
+    capacity and the refill over that period. Safe methods are not throttled.
+    """
+    cache_format = 'bucket_%(scope)s_%(ident)s'
+
+    def allow_request(self, request, view):
+        if self.rate is None or request.method in SAFE_METHODS:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        return self.consume()
+
+    def consume(self):
+        allowed, self.retry_after = get_bucket_store().consume(
+            self.key, self.num_requests, self.num_requests / self.duration, self.timer()
+        )
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'money_user'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
+
+
+class AccountTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Throttle the operations of each account.
+
+    Authenticated requests are charged to the user's own account when they are
+    admitted. Anonymous consignations are charged to their target account only
+    once the view has validated them, through charge_validated_consignation,
+    so invalid requests cannot drain someone else's bucket.
+    """
+    scope = 'money_account'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return self.key_for(request.user.pk)
+
+    def key_for(self, user_id):
+        return self.cache_format % {'scope': self.scope, 'ident': f'user:{user_id}'}
+
+
+def charge_validated_consignation(request, user_id):
+    """
+    Charge a validated anonymous consignation to its target account's bucket.
+
+    Args:
+        request (Request): The consignation request.
+        user_id (int): The user owning the target account.
+
+    Raises:
+        Throttled: When the target account's bucket is empty.
+    """
+    if request.user and request.user.is_authenticated:
+        return
+    throttle = AccountTokenBucketThrottle()
+    if throttle.rate is None:
+        return
+    throttle.key = throttle.key_for(user_id)
+    if not throttle.consume():
+        raise Throttled(wait=throttle.wait())
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'money_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+def velocity_charge(request):
+    """
+    Find the velocity window a money request counts towards, and its amount.
+
+    Returns:
+        tuple: The window key and the amount in cents, or None when the request
+               is not limited, e.g. its amount is invalid and the serializer
+               will reject it.
+    """
+    if request.method in SAFE_METHODS:
+        return None
+    key = account_key(request)
+    if key is None:
+        return None
+    return account_velocity_charge(key, request_value(request, 'amount'))
+
+
+def account_velocity_charge(key, amount):
+    """
+    Find the velocity window of an account key, as built by account_key, and
+    the amount in cents, or None when ACCOUNT_VELOCITY_LIMIT is not set or
+    the amount is not a positive number.
+    """
+    if not getattr(settings, 'ACCOUNT_VELOCITY_LIMIT', None):
+        return None
+    try:
+        amount = Decimal(str(amount))
+    except (InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite() or amount <= 0:
+        return None
+    # Totals are kept in cents so shared caches can incr them atomically
+    return f'velocity_{key}', int(amount * 100)
+
+
+def add_velocity(charge):
+    """
+    Count a charge from account_velocity_charge towards its window, once the
+    current transaction commits.
+    """
+    key, cents = charge
+    window = settings.ACCOUNT_VELOCITY_LIMIT['window']
+    transaction.on_commit(lambda: get_bucket_store().add_to_window(key, cents, window, time.time()))
+
+
+def record_velocity(request):
+    """
+    Count the amount of a successful money request towards its account's
+    velocity window, once the operation's transaction commits.
+
+    Args:
+        request (Request): The request whose operation succeeded.
+    """
+    charge = velocity_charge(request)
+    if charge is not None:
+        add_velocity(charge)
+
+
+def check_velocity(charge, now):
+    """
+    Check that a charge from account_velocity_charge fits in its sliding window.
+
+    Returns:
+        tuple: Whether it fits, and otherwise the seconds until it does, None
+               if the amount is over the limit on its own.
+    """
+    key, cents = charge
+    limit = int(Decimal(settings.ACCOUNT_VELOCITY_LIMIT['amount']) * 100)
+    window = settings.ACCOUNT_VELOCITY_LIMIT['window']
+    current, previous = get_bucket_store().window_totals(key, window, now)
+    elapsed = (now % window) / window
+    if current + cents + previous * (1 - elapsed) <= limit:
+        return True, None
+    return False, AccountVelocityThrottle.time_until_fits(cents, limit, window, now, current, previous)
+
+
+class AccountVelocityThrottle(BaseThrottle):
+    """
+    Limit the total amount moved by an account within a sliding window.
+
+    Uses settings.ACCOUNT_VELOCITY_LIMIT = {'amount': ..., 'window': seconds}.
+    Admission only checks that the amount fits in the window; the amount is
+    counted by record_velocity once the operation commits, so rejected and
+    failed requests do not use up the account's allowance. Requests admitted
+    concurrently can together go over the limit by their own amounts.
+
+    The window total is estimated from the current and previous fixed windows,
+    weighting the previous one by how much of it still overlaps.
+    """
+    timer = time.time
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        charge = velocity_charge(request)
+        if charge is None:
+            return True
+        allowed, self.retry_after = check_velocity(charge, self.timer())
+        return allowed
+
+    @staticmethod
+    def time_until_fits(cents, limit, window, now, current, previous):
+        """
+        Compute the seconds until an amount fits in the sliding window.
+
+        Returns:
+            float: The seconds to wait, or None if the amount is over the limit on its own.
+        """
+        if cents > limit:
+            return None
+        until_next_window = window - now % window
+        if current + cents <= limit:
+            # The previous window's share has to shrink within this window
+            return max(until_next_window - (limit - current - cents) / previous * window, 0)
+        # The current window's total becomes the previous one and has to shrink in turn
+        return until_next_window + (1 - (limit - cents) / current) * window
+
+    def wait(self):
+        return self.retry_after
@@ -33,7 +33,11 @@
 # api/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .apiViews import LoginAPIView, RegisterViewSet, ConsignationAPI, WithdrawalAPI, TransferAPIView, UserProfileAPIView
+from .apiViews import (
+    LoginAPIView, RegisterViewSet, ConsignationAPI, WithdrawalAPI, TransferAPIView, UserProfileAPIView, CustomerSearchAPIView,
+    ProfileListAPIView, ProfileDownloadAPIView, ScheduledTransferAPIView, ScheduledTransferCancelAPIView
+)
+from .views import balance_events
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
@@ -48,4 +52,10 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),  
     path('transfer/', TransferAPIView.as_view(), name='transfer'),
     path('profile/', UserProfileAPIView.as_view(), name='user_profile'),
+    path('scheduled-transfers/', ScheduledTransferAPIView.as_view(), name='scheduled_transfers'),
+    path('scheduled-transfers/<int:pk>/', ScheduledTransferCancelAPIView.as_view(), name='scheduled_transfer_cancel'),
+    path('events/', balance_events, name='balance_events'),
+    path('customers/search/', CustomerSearchAPIView.as_view(), name='customer_search'),
+    path('profiles/', ProfileListAPIView.as_view(), name='profile_list'),
+    path('profiles/<str:name>/', ProfileDownloadAPIView.as_view(), name='profile_download'),
 ]
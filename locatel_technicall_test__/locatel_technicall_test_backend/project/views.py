@@ -1,3 +1,93 @@
-from django.shortcuts import render
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from .events import get_broker
 
-# Create your views here.
+
+def authenticate_stream(request):
+    """
+    Authenticate a streaming request with its JWT access token.
+
+    EventSource cannot send headers, so the token may also come in the
+    'token' query parameter.
+
+    Args:
+        request (HttpRequest): The incoming request.
+
+    Returns:
+        tuple: The authenticated user and the token's exp claim as a Unix
+               timestamp, or (None, None) if the token is missing or invalid.
+    """
+    authenticator = JWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None, None
+    try:
+        token = authenticator.get_validated_token(raw_token)
+        return authenticator.get_user(token), token['exp']
+    except (InvalidToken, AuthenticationFailed):
+        return None, None
+
+
+async def event_stream(user_id, expires_at):
+    """
+    Yield Server-Sent Events for a user until the client disconnects or the
+    access token the stream was opened with expires.
+
+    The stream then ends with an 'expired' event and the client has to
+    reconnect with a fresh token, so a stream never outlives its token.
+
+    Args:
+        user_id (int): ID of the user whose events are streamed.
+        expires_at (float): The token's exp claim, as a Unix timestamp.
+    """
+    broker = get_broker()
+    subscription, queue = broker.subscribe(user_id)
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT_SECONDS', 15)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                yield "event: expired\ndata: {}\n\n"
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                # Comment lines keep proxies from closing idle connections
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    finally:
+        broker.unsubscribe(user_id, subscription)
+
+
+async def balance_events(request):
+    """
+    Stream balance changes and new transactions of the authenticated user.
+
+    Args:
+        request (HttpRequest): The request object, authenticated with a JWT access token.
+
+    Returns:
+        StreamingHttpResponse: A text/event-stream response, 401 if the token is invalid,
+                               or 501 when the server is not running under ASGI.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"message": "Event stream requires an ASGI server."}, status=501)
+
+    user, expires_at = await sync_to_async(authenticate_stream)(request)
+    if user is None:
+        return JsonResponse({"message": "Authentication credentials were not provided or are invalid."}, status=401)
+
+    response = StreamingHttpResponse(event_stream(user.id, expires_at), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
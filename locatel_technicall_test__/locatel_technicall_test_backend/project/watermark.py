@@ -0,0 +1,59 @@
+import time
+from django.db.models import Q
+
+
+class IdWatermark:
+    """
+    Incremental loading of a table by id, safe against out-of-order commits.
+
+    Ids are assigned at insert time but rows become visible at commit, so a
+    row can show up below the highest id already loaded. Every id skipped by a
+    load is kept as a gap and looked up again by the following loads, until it
+    appears or gap_seconds pass; most gaps are rolled back or deleted rows.
+    Only the max_gaps highest gaps are kept.
+    """
+
+    def __init__(self, gap_seconds, max_gaps=5000):
+        self.gap_seconds = gap_seconds
+        self.max_gaps = max_gaps
+        self.reset()
+
+    def reset(self):
+        self.last_id = 0
+        self._gaps = {}
+
+    def load(self, queryset):
+        """
+        Yield the rows of a values_list queryset, with the id first, that were not
+        loaded yet: rows above the watermark and rows filling a gap.
+        """
+        condition = Q(id__gt=self.last_id)
+        if self._gaps:
+            condition |= Q(id__in=list(self._gaps))
+        floor = self.last_id
+        now = time.monotonic()
+
+        for row in queryset.filter(condition).order_by('id').iterator(chunk_size=10000):
+            row_id = row[0]
+            if row_id <= floor:
+                self._gaps.pop(row_id, None)
+            else:
+                for missing in range(max(self.last_id + 1, row_id - self.max_gaps), row_id):
+                    self._gaps[missing] = now
+                self.last_id = row_id
+                # Trimmed along the way, a load over a sparse table skips many ids
+                if len(self._gaps) > 2 * self.max_gaps:
+                    self._trim()
+            yield row
+
+        self._gaps = {
+            gap: seen_at for gap, seen_at in self._gaps.items() if now - seen_at < self.gap_seconds
+        }
+        if len(self._gaps) > self.max_gaps:
+            self._trim()
+
+    def _trim(self):
+        self._gaps = dict(sorted(self._gaps.items())[-self.max_gaps:])
+
+    def __len__(self):
+        return len(self._gaps)